@@ -28,13 +28,14 @@ def read_arguments():
     parser.add_argument('-i', '--input', help='Directory with the gWikiMatch files (only .tsv files are read)', required=True)
     parser.add_argument('-o', '--output', help='Directory with output images', required=True)
     parser.add_argument('-d', '--maxdegree', help='The maximum number of degrees per per vertex', required=True, type=int)
+    parser.add_argument('-w', '--workers', help='The number of processes that calculate the Milne&Witten scores', required=False, type=int, default=1)
 
     args = vars(parser.parse_args())
 
     output = args["output"]
     os.makedirs( output, exist_ok=True)
 
-    return ( args["input"], output,  args["maxdegree"])
+    return ( args["input"], output,  args["maxdegree"], args["workers"])
 
 
 def get_article( url):
@@ -235,7 +236,7 @@ def visualize_Distance( data, imagefile):
 
 ## Main part
 if __name__ == '__main__':
-    (input, outputdir, max_degree) = read_arguments()
+    (input, outputdir, max_degree, workers) = read_arguments()
 
     data = read_files(input)
     depths = [200]
@@ -249,7 +250,7 @@ if __name__ == '__main__':
             graph = WikiGraph(language="en", sql_dir=wikipedia_dumpdir, cache_dir="cache", max_degree=max_degree)
             graph.remove_nodes_degree_greater_than( depth )
 
-            data['MilneWitten'] = data.apply(lambda row: graph.get_Milne_Witten(row.word1, row.word2), axis=1)
+            data['MilneWitten'] = graph.milne_witten_batch(list(zip(data.word1, data.word2)), workers=workers)
             graph.remove_cache_files()
             data.to_csv(datafile, sep='\t')
         else:
@@ -267,7 +268,7 @@ if __name__ == '__main__':
     #         graph = WikiGraph(language="en", sql_dir=wikipedia_dumpdir, cache_dir="cache", max_degree=max_degree)
     #         graph.remove_nodes_degree_greater_than( depth )
     #
-    #         data['distance'] = data.apply( lambda row: graph.get_distance( row.word1, row.word2), axis=1)
+    #         data['distance'] = graph.distances_batch(list(zip(data.word1, data.word2)), workers=workers)
     #         graph.remove_cache_files()
     #         data.to_csv(datafile, sep='\t')
     #     else:
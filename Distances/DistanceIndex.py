@@ -1,29 +1,49 @@
 # Class that contains functionality for computing the distance
+import multiprocessing
+import os
+import tempfile
+
 import numpy as np
-import sklearn
 from tqdm import *
 
+import functions
 from Distances.DocumentRelations import DocumentRelations
+from Distances.VectorStore import VectorStore
 from annoy import AnnoyIndex
 from scipy.spatial import distance as spdistance
 
 
 NUMBEROFTREES = 50
+BLOCKSIZE = 4096    # Number of rows and columns compared at once by the exact search
 
 class DistanceIndex:
-    def __init__(self, documentvectors):
+    def __init__(self, documentvectors, number_of_trees=NUMBEROFTREES):
         self.documentvectors = documentvectors
+        self.number_of_trees = number_of_trees
         self.index = AnnoyIndex( documentvectors.get_vector_size(), "angular")
         self.index_to_id = {}
         self.id_to_index = {}
         self.search_k_multiply = 2
+        self.search_k = -1      # search_k used by calculate_relations_ann, -1 is the default of annoy
+        self.index_file = None  # File the index is saved in, so it can be memory mapped by workers
 
     def build(self):
         """
-        Build the index based on the documentvectors
+        Build the index based on the documentvectors, when the vectors are read from a VectorStore
+        the index is saved in the store and memory mapped the next time it is built with the same vectors
         :return:
         """
 
+        index_file = self.__persistent_index_file()
+        if not index_file is None and os.path.isfile(index_file + ".ids"):
+            self.index.load(index_file)
+            with open(index_file + ".ids", mode="r", encoding="utf-8") as ids_file:
+                for (i, id) in enumerate(ids_file.read().splitlines()):
+                    self.index_to_id[i] = id
+                    self.id_to_index[id] = i
+            self.index_file = index_file
+            return
+
         i = 0
         for dv in self.documentvectors:
             id = dv.get_id()
@@ -32,28 +52,60 @@ class DistanceIndex:
             self.index.add_item(i, dv.get_vector())
             i += 1
 
-        self.index.build(NUMBEROFTREES)
+        self.index.build(self.number_of_trees)
+
+        if not index_file is None:
+            self.index.save(index_file)
+            # The ids are written last, they mark the index as complete
+            with open(index_file + ".ids", mode="w", encoding="utf-8") as ids_file:
+                for i in range(0, len(self.index_to_id)):
+                    ids_file.write(self.index_to_id[i] + "\n")
+            self.index_file = index_file
+
+
+    def __persistent_index_file(self):
+        """
+        Determines the file of the index, based on the hash of the vectors and the number of trees
+        :return: the file or None if the vectors are not read from a VectorStore
+        """
+
+        store = self.documentvectors.vectors
+        if isinstance(store, VectorStore):
+            return os.path.join(store.directory, f"annoy_{store.get_content_hash()}_{self.number_of_trees}.ann")
+        else:
+            return None
+
+
+    def __remove_persistent_index(self):
+        """
+        Unload the index and remove its files from the VectorStore, used for an index that is not needed anymore
+        :return:
+        """
 
+        self.index.unload()
+        index_file = self.__persistent_index_file()
+        if not index_file is None:
+            for file in [index_file + ".ids", index_file]:     # The ids first, they mark the index as complete
+                if os.path.isfile(file):
+                    os.remove(file)
 
 
-    def calculate_relations(self, minimal_similarity, nearest_lim=2, second_index=None):
+
+    def calculate_relations(self, minimal_similarity, nearest_lim=2, second_index=None, workers=1):
         """
         Determine the relations between the documents given the minimal distance
         :param minimal_similarity: value between 0 and 1
         :param second_index: The name of the index to compare to, if ommitted the index is compared to itself
         :param nearest_lim: Limit
+        :param workers: the number of processes used to query the index
         :return: a object with document relations
         """
 
         dr = DocumentRelations([])
         index_to_compare_to = second_index if not second_index is None else self
 
-        for dv in self.documentvectors:
-            src_id = dv.get_id()
-            vector = np.array( dv.get_vector())
-            src_index = self.id_to_index[src_id]
-
-            (dest_indexes, distances) = index_to_compare_to.index.get_nns_by_vector(vector,n=nearest_lim + 1, search_k=(nearest_lim + 1)* self.search_k_multiply, include_distances=True)
+        for (src_index, dest_indexes, distances) in self.__nearest_neighbours(index_to_compare_to, nearest_lim + 1, (nearest_lim + 1) * self.search_k_multiply, workers):
+            src_id = self.index_to_id[src_index]
             similarities = 1.0 / (1.0 + np.array( distances))
 
             added = 0
@@ -65,6 +117,163 @@ class DistanceIndex:
 
         return dr
 
+
+    def __nearest_neighbours(self, index_to_compare_to, n, search_k, workers):
+        """
+        Query the index to compare to with every vector of this index
+        :param index_to_compare_to: DistanceIndex object
+        :param n: the number of neighbours
+        :param search_k: the search_k parameter of annoy
+        :param workers: the number of processes, the indexes are memory mapped from disk by every process
+        :return: generator of tuples (src_index, dest_indexes, distances)
+        """
+
+        if workers <= 1:
+            for dv in self.documentvectors:
+                src_index = self.id_to_index[dv.get_id()]
+                (dest_indexes, distances) = index_to_compare_to.index.get_nns_by_vector(np.array( dv.get_vector()), n=n, search_k=search_k, include_distances=True)
+                yield (src_index, dest_indexes, distances)
+
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                files = (self.__saved_index(tmp_dir), index_to_compare_to.__saved_index(tmp_dir))
+                tasks = [(start, min(start + BLOCKSIZE, len(self.index_to_id)), n, search_k) for start in range(0, len(self.index_to_id), BLOCKSIZE)]
+                with multiprocessing.Pool(workers, initializer=init_ann_worker, initargs=files + (self.index.f,)) as pool:
+                    for results in pool.imap(ann_worker, tasks):
+                        yield from results
+
+
+    def __saved_index(self, directory):
+        """
+        Returns the file of the index, the index is saved in the directory if it wasn't saved before
+        :param directory:
+        :return: the file
+        """
+
+        if self.index_file is None or not os.path.isfile(self.index_file):
+            self.index_file = os.path.join(directory, f"index_{id(self)}.ann")
+            self.index.save(self.index_file)
+
+        return self.index_file
+
+
+    def rebuild(self, number_of_trees):
+        """
+        Build the index again with another number of trees
+        :param number_of_trees:
+        :return:
+        """
+
+        self.number_of_trees = number_of_trees
+        self.index = AnnoyIndex( self.documentvectors.get_vector_size(), "angular")
+        self.index_to_id = {}
+        self.id_to_index = {}
+        self.index_file = None
+        self.build()
+
+
+    @staticmethod
+    def angular_to_cosine(distances):
+        """
+        Convert the angular distances of annoy, sqrt(2 * (1 - cos)), into cosine similarities
+        :param distances: list of distances
+        :return: numpy array with the similarities
+        """
+
+        distances = np.array(distances, dtype=np.float32)
+        return 1.0 - (distances * distances) / 2.0
+
+
+    def calculate_relations_ann(self, minimal_similarity, second_index=None, maximum_number_of_results=100, corpus_pairs=None, target_recall=None, workers=1, relations=None):
+        """
+        Determine the relations between the documents given the minimal distance by using the ANN. The similarities
+        are cosine similarities, on the same scale as calculate_relations_less_slow, and like there a document that
+        is found as its own neighbour counts for the maximum number of results
+        :param minimal_similarity: value between 0 and 1
+        :param second_index: The name of the index to compare to, if ommitted the index is compared to itself
+        :param maximum_number_of_results:
+        :param corpus_pairs: Create relations for the pairs in the corpus only
+        :param target_recall: if given, the number of trees and search_k are calibrated to reach this recall
+        :param workers: the number of processes used to query the index
+        :param relations: optional object the relations are added to, for example a DocumentRelationsWriter
+        :return: a object with document relations
+        """
+
+        index_to_compare_to = second_index if not second_index is None else self
+        if not target_recall is None:
+            self.calibrate(target_recall, minimal_similarity, second_index=second_index, maximum_number_of_results=maximum_number_of_results)
+
+        dr = relations if not relations is None else DocumentRelations([])
+        for (src_index, dest_indexes, distances) in self.__nearest_neighbours(index_to_compare_to, maximum_number_of_results, self.search_k, workers):
+            src_id = self.index_to_id[src_index]
+            for (dest_index, similarity) in zip( dest_indexes, DistanceIndex.angular_to_cosine( distances)):
+                if similarity < minimal_similarity:
+                    break
+
+                dest_id = index_to_compare_to.index_to_id[dest_index]
+                if corpus_pairs is None or corpus_pairs.pair_is_available( src_id, dest_id):  # Only if we want this pair
+                    if not(second_index is None) or src_id != dest_id:    # When camparing to the same index, skip identical documents
+                        dr.add(src=src_id, dest=dest_id, similarity=float(similarity))
+
+        return dr
+
+
+    def calibrate(self, target_recall, minimal_similarity, second_index=None, maximum_number_of_results=100, sample_size=1000, maximum_number_of_trees=800):
+        """
+        Choose the number of trees of the index to compare to and the search_k of this index, so the ANN reaches the
+        target recall. The recall is measured on a sample of the documents against the exact top-k join. The indexes
+        with fewer trees that are built during the calibration are removed from the VectorStore
+        :param target_recall: value between 0 and 1
+        :param minimal_similarity: value between 0 and 1
+        :param second_index: The name of the index to compare to, if ommitted the index is compared to itself
+        :param maximum_number_of_results:
+        :param sample_size: the number of documents used to measure the recall
+        :param maximum_number_of_trees: the number of trees is doubled until the recall is reached or this maximum
+        :return: (number_of_trees, search_k, recall)
+        """
+
+        index_to_compare_to = second_index if not second_index is None else self
+        (docids1, matrix1) = self.documentvectors.get_index_and_matrix()
+        (docids2, matrix2) = index_to_compare_to.documentvectors.get_index_and_matrix()
+        sample = np.sort(np.random.default_rng(0).choice(len(docids1), size=min(sample_size, len(docids1)), replace=False))
+        queries = np.asarray(matrix1, dtype=np.float32)[sample]
+
+        # The exact results of the sample, without the documents themselves
+        exact = []
+        for (start, indexes, similarities) in DistanceIndex.top_k_join(queries, matrix2, maximum_number_of_results, minimal_similarity):
+            for row in range(0, indexes.shape[0]):
+                src_id = docids1[sample[start + row]]
+                dest_ids = [docids2[i2] for (i2, similarity) in zip(indexes[row], similarities[row]) if similarity >= minimal_similarity]
+                exact.append(set([dest_id for dest_id in dest_ids if not second_index is None or dest_id != src_id]))
+        nr_of_exact = sum([len(dest_ids) for dest_ids in exact])
+
+        recall = 1.0
+        while True:
+            n = maximum_number_of_results
+            for multiply in [1, 2, 4, 8, 16, 32, 64]:
+                search_k = n * index_to_compare_to.number_of_trees * multiply
+                found = 0
+                for (row, dest_ids) in enumerate(exact):
+                    (dest_indexes, distances) = index_to_compare_to.index.get_nns_by_vector(queries[row], n=n, search_k=search_k, include_distances=True)
+                    ann_ids = [index_to_compare_to.index_to_id[dest_index] for dest_index in dest_indexes]
+                    ann_ids = [dest_id for dest_id in ann_ids if not second_index is None or dest_id != docids1[sample[row]]]
+                    found += len(dest_ids.intersection(ann_ids))
+
+                recall = float(found) / float(nr_of_exact) if nr_of_exact > 0 else 1.0
+                if recall >= target_recall:
+                    break
+
+            if recall >= target_recall or index_to_compare_to.number_of_trees * 2 > maximum_number_of_trees:
+                break
+            index_to_compare_to.__remove_persistent_index()
+            index_to_compare_to.rebuild(index_to_compare_to.number_of_trees * 2)
+
+        self.search_k = search_k
+        functions.show_message(f"ANN calibrated: {index_to_compare_to.number_of_trees} trees, search_k {search_k}, recall {recall:0.3f}")
+
+        return (index_to_compare_to.number_of_trees, search_k, recall)
+
+
     def calculate_relations_slow(self, minimal_similarity, second_index=None):
         """
         Determine the relations between the documents given the minimal distance, this is without using the ANN
@@ -95,44 +304,154 @@ class DistanceIndex:
 
         return dr
 
-    def calculate_relations_less_slow(self, minimal_similarity, second_index=None, maximum_number_of_results=100, corpus_pairs=None):
+    def calculate_relations_less_slow(self, minimal_similarity, second_index=None, maximum_number_of_results=100, corpus_pairs=None, block_size=BLOCKSIZE, workers=1, relations=None):
         """
         Determine the relations between the documents given the minimal distance, this is without using the ANN,
-        but by using sklearn to compare to matrices
+        but by using an exact blocked top-k join of the two matrices
         :param minimal_similarity: value between 0 and 1
         :param second_index: The name of the index to compare to, if ommitted the index is compared to itself
         :param maximum_number_of_results:
         :param corpus_pairs: Create relations for the pairs in the corpus only
+        :param block_size: the number of rows (and columns) that are compared at once, this bounds the memory used
+        :param workers: the number of processes, every process compares a part of the rows
+        :param relations: optional object the relations are added to, for example a DocumentRelationsWriter
         :return: a object with document relations
         """
 
+        index_to_compare_to = second_index if not second_index is None else self
         (docids1, matrix1) = self.documentvectors.get_index_and_matrix()
-        (docids2, matrix2) = (second_index if not second_index is None else self) .documentvectors.get_index_and_matrix()
+        (docids2, matrix2) = index_to_compare_to.documentvectors.get_index_and_matrix()
 
-        orgsims =  sklearn.metrics.pairwise.cosine_similarity(matrix1, matrix2, dense_output=False)
-        # distances = 1 - orgsims
-        # sims = 1.0 / (1.0 + distances)
-        sims = orgsims
-        last_sim_row = sims.shape[1]
+        dr = relations if not relations is None else DocumentRelations([])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if workers <= 1:
+                blocks = DistanceIndex.top_k_join(matrix1, matrix2, maximum_number_of_results, minimal_similarity, block_size=block_size)
+            else:
+                blocks = self.__parallel_top_k_join(index_to_compare_to, tmp_dir, len(docids1), maximum_number_of_results, minimal_similarity, block_size, workers)
 
-        dr = DocumentRelations([])
-        for i1 in range(0, len(docids1)):
-            sorted = np.argsort( sims[i1]).tolist()
-            sorted.reverse() # We want to order descending
-            for iSorted in range(0, min( last_sim_row, maximum_number_of_results)):
-                i2 = sorted[iSorted]
-                if sims[i1, i2] >= minimal_similarity:
-                    docid1 = docids1[i1]
-                    docid2 = docids2[i2]
-                    if corpus_pairs is None or corpus_pairs.pair_is_available( docid1, docid2):  # Only if we want this pair
-                        if not(second_index is None) or docid1 != docid2:   # When camparing to the same index, skip identical documents
-                            dr.add(src=docid1, dest=docid2, similarity=sims[i1, i2])
-                else:
-                    break
+            for (start, indexes, similarities) in blocks:
+                for row in range(0, indexes.shape[0]):
+                    docid1 = docids1[start + row]
+                    for (i2, similarity) in zip(indexes[row], similarities[row]):
+                        if similarity >= minimal_similarity:
+                            docid2 = docids2[i2]
+                            if corpus_pairs is None or corpus_pairs.pair_is_available( docid1, docid2):  # Only if we want this pair
+                                if not(second_index is None) or docid1 != docid2:   # When camparing to the same index, skip identical documents
+                                    dr.add(src=docid1, dest=docid2, similarity=float(similarity))
+                        else:
+                            break
 
         return dr
 
 
+    def __parallel_top_k_join(self, index_to_compare_to, tmp_dir, nr_of_rows, k, minimal_similarity, block_size, workers):
+        """
+        Runs the top_k_join in a pool of processes, every process memory maps both matrices
+        :param index_to_compare_to: DistanceIndex object
+        :param tmp_dir: directory for matrices that are not in a VectorStore
+        :param nr_of_rows: the number of rows of the matrix of this index
+        :param k: the maximum number of results per row
+        :param minimal_similarity:
+        :param block_size:
+        :param workers: the number of processes
+        :return: generator with the same output as top_k_join
+        """
+
+        matrices = self.__shared_matrix(tmp_dir) + index_to_compare_to.__shared_matrix(tmp_dir)
+        tasks = [(start, min(start + block_size, nr_of_rows), k, minimal_similarity, block_size) for start in range(0, nr_of_rows, block_size)]
+        with multiprocessing.Pool(workers, initializer=init_join_worker, initargs=matrices + (block_size,)) as pool:
+            for blocks in pool.imap(join_worker, tasks):
+                yield from blocks
+
+
+    def __shared_matrix(self, directory):
+        """
+        Returns a file with the document matrix that can be memory mapped by other processes, when the vectors are
+        not read from a VectorStore the matrix is saved in the directory
+        :param directory:
+        :return: (file, rows) where rows are the rows of the matrix that are used, None for all rows
+        """
+
+        if isinstance(self.documentvectors.vectors, VectorStore):
+            return self.documentvectors.vectors.get_document_file()
+
+        (ids, matrix) = self.documentvectors.get_index_and_matrix()
+        file = os.path.join(directory, f"matrix_{id(self)}.npy")
+        if not os.path.isfile(file):
+            np.save(file, np.asarray(matrix, dtype=np.float32))
+
+        return (file, None)
+
+
+    @staticmethod
+    def top_k_join(matrix1, matrix2, k, minimal_similarity, block_size=BLOCKSIZE, norms2=None):
+        """
+        Exact top-k cosine similarity join of the rows of matrix1 with the rows of matrix2. The matrices are compared in
+        tiles of block_size x block_size, only the best k of every row are kept, so the peak memory does not depend on
+        the number of documents
+        :param matrix1: matrix (or memory map) with the vectors as rows
+        :param matrix2: matrix (or memory map) with the vectors as rows
+        :param k: the maximum number of results per row
+        :param minimal_similarity: similarities below this value are not returned
+        :param block_size: the number of rows (and columns) in a tile
+        :param norms2: the norms of the rows of matrix2, if they were calculated before
+        :return: generator of tuples (start, indexes, similarities) for every block of rows starting at row 'start' of
+                 matrix1. The indexes and similarities have k columns and are sorted descending, similarities below the
+                 minimal similarity are -inf
+        """
+
+        matrix1 = np.asarray(matrix1, dtype=np.float32)
+        matrix2 = np.asarray(matrix2, dtype=np.float32)
+        k = min(k, matrix2.shape[0])
+        if k <= 0:
+            return
+
+        if norms2 is None:
+            norms2 = DistanceIndex.row_norms(matrix2, block_size)
+        for start in range(0, matrix1.shape[0], block_size):
+            block = np.array(matrix1[start:start + block_size])
+            block /= DistanceIndex.row_norms(block, block_size)[:, None]
+
+            best_similarities = np.full((block.shape[0], k), -np.inf, dtype=np.float32)
+            best_indexes = np.zeros((block.shape[0], k), dtype=np.int64)
+            for column_start in range(0, matrix2.shape[0], block_size):
+                tile = block @ matrix2[column_start:column_start + block_size].T
+                tile /= norms2[None, column_start:column_start + block_size]
+                tile[tile < minimal_similarity] = -np.inf
+                if not np.isfinite(tile).any():  # Nothing in this tile is similar enough
+                    continue
+
+                # Partial selection of the best of the tile, merged with the best so far
+                tile_k = min(k, tile.shape[1])
+                tile_indexes = np.argpartition(-tile, tile_k - 1, axis=1)[:, :tile_k]
+                candidate_similarities = np.concatenate((best_similarities, np.take_along_axis(tile, tile_indexes, axis=1)), axis=1)
+                candidate_indexes = np.concatenate((best_indexes, tile_indexes + column_start), axis=1)
+
+                keep = np.argpartition(-candidate_similarities, k - 1, axis=1)[:, :k]
+                best_similarities = np.take_along_axis(candidate_similarities, keep, axis=1)
+                best_indexes = np.take_along_axis(candidate_indexes, keep, axis=1)
+
+            order = np.argsort(-best_similarities, axis=1, kind="stable")
+            yield (start, np.take_along_axis(best_indexes, order, axis=1), np.take_along_axis(best_similarities, order, axis=1))
+
+
+    @staticmethod
+    def row_norms(matrix, block_size=BLOCKSIZE):
+        """
+        Calculate the norms of the rows of the matrix in blocks, zero norms are replaced by 1
+        :param matrix:
+        :param block_size:
+        :return: array with the norm of every row
+        """
+
+        norms = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], block_size):
+            norms[start:start + block_size] = np.linalg.norm(matrix[start:start + block_size], axis=1)
+        norms[norms == 0] = 1.0
+
+        return norms
+
+
 
     def cosine_sim(self, id1, id2):
         """
@@ -148,3 +467,74 @@ class DistanceIndex:
             return 1. / (1. + spdistance.cosine(vector1.get_vector(), vector2.get_vector()))
         else:
             return  None
+
+
+
+# The functions below are executed in the worker processes, the state is set once per process by the initializers
+worker_state = {}
+
+def init_join_worker(file1, rows1, file2, rows2, block_size):
+    """
+    Memory map the matrices of the join in this process, the rows of the first matrix are gathered per task,
+    so the memory map is shared with the other processes
+    :param file1: the npy file with the first matrix
+    :param rows1: the rows of the first matrix that are used, None for all
+    :param file2: the npy file with the second matrix
+    :param rows2: the rows of the second matrix that are used, None for all
+    :param block_size:
+    :return:
+    """
+
+    matrix1 = np.load(file1, mmap_mode="r")
+    matrix2 = np.load(file2, mmap_mode="r")
+    worker_state["matrix1"] = matrix1
+    worker_state["rows1"] = rows1
+    worker_state["matrix2"] = matrix2 if rows2 is None else matrix2[rows2]
+    worker_state["norms2"] = DistanceIndex.row_norms(worker_state["matrix2"], block_size)
+
+
+def join_worker(task):
+    """
+    Join the rows start:stop of the first matrix with the second matrix
+    :param task: tuple (start, stop, k, minimal_similarity, block_size)
+    :return: list with the output of top_k_join, with the start relative to the whole first matrix
+    """
+
+    (start, stop, k, minimal_similarity, block_size) = task
+    rows1 = worker_state["rows1"]
+    matrix1 = worker_state["matrix1"][start:stop] if rows1 is None else worker_state["matrix1"][rows1[start:stop]]
+    blocks = DistanceIndex.top_k_join(matrix1, worker_state["matrix2"], k, minimal_similarity, block_size=block_size, norms2=worker_state["norms2"])
+
+    return [(start + block_start, indexes, similarities) for (block_start, indexes, similarities) in blocks]
+
+
+def init_ann_worker(file1, file2, vector_size):
+    """
+    Memory map the annoy indexes in this process
+    :param file1: the index with the query vectors
+    :param file2: the index to query
+    :param vector_size:
+    :return:
+    """
+
+    worker_state["index1"] = AnnoyIndex(vector_size, "angular")
+    worker_state["index1"].load(file1)
+    worker_state["index2"] = AnnoyIndex(vector_size, "angular")
+    worker_state["index2"].load(file2)
+
+
+def ann_worker(task):
+    """
+    Query the second index with the items start:stop of the first index
+    :param task: tuple (start, stop, n, search_k)
+    :return: list of tuples (src_index, dest_indexes, distances)
+    """
+
+    (start, stop, n, search_k) = task
+    results = []
+    for src_index in range(start, stop):
+        vector = worker_state["index1"].get_item_vector(src_index)
+        (dest_indexes, distances) = worker_state["index2"].get_nns_by_vector(vector, n=n, search_k=search_k, include_distances=True)
+        results.append((src_index, dest_indexes, distances))
+
+    return results
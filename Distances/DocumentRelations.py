@@ -1,16 +1,78 @@
 # Class to read and write document relations
 import gc
+from array import array
 
 from Distances.DocumentRelation import DocumentRelation
+from Distances.DocumentRelationsWriter import DocumentRelationsWriter, RELATIONTABLES
+from Distances.RelationsSidecar import RelationsSidecar
 from lxml import etree as ET
 import html
+import numpy as np
 import functions
 
 class DocumentRelations:
     def __init__(self, relations):
         super( DocumentRelations)
-        self.relations = relations
-        self.is_dirty = True
+        # The relations are stored in columns, the ids are interned so the columns only contain integers
+        self.ids = []               # The interned ids, the position in the list is the index of the id
+        self.id_to_index = {}       # Dictionary with the id as key and the index as value
+        self.srcs = array("i")      # Index of the source id of every relation
+        self.dests = array("i")     # Index of the destination id of every relation
+        self.similarities = array("d")
+        self.pair_index = None      # Dictionary with the key of the (src, dest) pair as key and the row as value, created when needed
+        self.is_dirty = True        # The per src index has to be recreated
+
+        for relation in relations:
+            self.add( relation.get_src(), relation.get_dest(), relation.get_similarity())
+
+
+    @staticmethod
+    def from_arrays(ids, srcs, dests, similarities):
+        """
+        Create a DocumentRelations object from the columns, for example the ones in the binary sidecar
+        :param ids: list with the interned ids
+        :param srcs: array with the index of the source id of every relation
+        :param dests: array with the index of the destination id of every relation
+        :param similarities: array with the similarity of every relation
+        :return: DocumentRelations object
+        """
+
+        dr = DocumentRelations([])
+        dr.ids = list(ids)
+        dr.id_to_index = {id: index for (index, id) in enumerate(dr.ids)}
+        dr.srcs = array("i", np.asarray(srcs, dtype=np.int32).tobytes())
+        dr.dests = array("i", np.asarray(dests, dtype=np.int32).tobytes())
+        dr.similarities = array("d", np.asarray(similarities, dtype=np.float64).tobytes())
+
+        return dr
+
+
+    def __intern(self, id):
+        """
+        Returns the index of the id, a new index is created for unknown ids
+        :param id:
+        :return:
+        """
+
+        index = self.id_to_index.get(id)
+        if index is None:
+            index = len(self.ids)
+            self.id_to_index[id] = index
+            self.ids.append(id)
+
+        return index
+
+
+    @staticmethod
+    def __pair_key(src_index, dest_index):
+        """
+        The key of a (src, dest) pair in the pair index
+        :param src_index:
+        :param dest_index:
+        :return:
+        """
+        return (src_index << 32) | dest_index
+
 
     def add(self, src, dest, similarity):
         """
@@ -20,41 +82,46 @@ class DocumentRelations:
         :param similarity: the similarity (between 0 and 1)
         :return:
         """
-        relation = DocumentRelation(src, dest, similarity)
-        self.relations.append( relation)
+        src_index = self.__intern(src)
+        dest_index = self.__intern(dest)
+        if not self.pair_index is None:
+            self.pair_index.setdefault(DocumentRelations.__pair_key(src_index, dest_index), len(self.srcs))
+
+        self.srcs.append( src_index)
+        self.dests.append( dest_index)
+        self.similarities.append( similarity)
         self.is_dirty = True
 
 
-    def save(self, filename, parameters):
+    def get_relation(self, row):
         """
-        Save the relations in the given Xml file, the params are added ass attributes to the root node
-        :param filename:the output file
-        :param parameters: dictionary of parameters
-        :return:
+        Returns the relation in the given row
+        :param row:
+        :return: DocumentRelation object
         """
+        return DocumentRelation(self.ids[self.srcs[row]], self.ids[self.dests[row]], self.similarities[row])
 
-        file = open(filename, mode="w", encoding="utf-8-sig")
-        file.write("<relations>\n")
-
-        root = ET.fromstring("<relations></relations>")
-        for (name, value) in parameters.items():
-            root.set(name, value)
 
-        for relation in self.relations:
-            document = ET.fromstring("<relation></relation>")
-
-            ET.SubElement(document, "src").text = relation.get_src()
-            ET.SubElement(document, "dest").text = relation.get_dest()
-            ET.SubElement(document, "similarity").text = str(relation.get_similarity())
+    def get_arrays(self):
+        """
+        Returns the relations as numpy arrays
+        :return: (ids, srcs, dests, similarities)
+        """
+        return (self.ids, np.array(self.srcs, dtype=np.int32), np.array(self.dests, dtype=np.int32), np.array(self.similarities, dtype=np.float64))
 
-            file.write( functions.xml_as_string(document))
-            del document
 
-        # Write the end of the file
-        file.write("</relations>\n")
-        file.close()
+    def save(self, filename, parameters, binary=True):
+        """
+        Save the relations in the given Xml file, the params are added ass attributes to the root node
+        :param filename:the output file
+        :param parameters: dictionary of parameters
+        :param binary: if true, a binary sidecar is written that is used by read
+        :return:
+        """
 
-        functions.write_pickle( filename, self.relations)
+        with DocumentRelationsWriter(filename, parameters, binary=binary) as writer:
+            for relation in self:
+                writer.add(relation.get_src(), relation.get_dest(), relation.get_similarity())
 
 
     def save_html(self, src_corpus, output, dest_corpus = None, startof_id_filter = None):
@@ -74,7 +141,7 @@ class DocumentRelations:
             htmlfile.write(f"<body>\n")
             htmlfile.write(f"<table>\n")
             htmlfile.write(f"<tr>\n<th>{html.escape(src_corpus.get_name())}</th><th>{html.escape(dst_corpus.get_name())}</th><th>Similarity</th></tr>")
-            rels = list(self.relations)
+            rels = list(self)
             rels.sort( key=lambda rel: rel.get_src())
             for relation in rels:
                 if startof_id_filter is None or relation.get_src().startswith( startof_id_filter) or relation.get_dest().startswith( startof_id_filter):
@@ -96,29 +163,34 @@ class DocumentRelations:
     def read(file):
         """
         Returns a new DocumentRelations object filled with the info in the Xml file, together with the parameters that generated the file
+        The binary sidecar is used if it is available, otherwise it is created
         :param file: xml file, that was created with a save
         :return: Tuple (DocumentVectors object, attributes dictionary)
         """
 
-        dr = functions.read_from_pickle( file, "dr")
-        attr = functions.read_from_pickle( file, "attr")
-        if dr is None or attr is None:
-            dr = DocumentRelations([])
-            root = ET.parse(file).getroot()
-            for document in root:
-                src = document.find("src").text
-                dest = document.find("dest").text
-                similarity = float(document.find("similarity").text)
-                dr.add( src, dest, similarity)
-
-            # copy the attributes
-            attr = {}
-            for name in root.attrib:
-                attr[name] = str(root.attrib[name])
+        sidecar = RelationsSidecar.read( file, RELATIONTABLES)
+        if not sidecar is None:
+            (ids, arrays, attr) = sidecar
+            relations = arrays["relations"]
+            dr = DocumentRelations.from_arrays(ids, relations["src"], relations["dest"], relations["similarity"])
 
-            functions.write_pickle( file, { "dr":dr, "attr": attr})
         else:
-            if type(dr).__name__ == 'list': dr = DocumentRelations(dr)
+            dr = DocumentRelations([])
+            attr = {}
+            for (event, element) in ET.iterparse( file, events=("start", "end")):
+                if event == "start" and element.tag == "relations":
+                    # copy the attributes
+                    for name in element.attrib:
+                        attr[name] = str(element.attrib[name])
+                elif event == "end" and element.tag == "relation":
+                    dr.add( element.find("src").text, element.find("dest").text, float(element.find("similarity").text))
+                    element.clear()
+
+            # Write the sidecar, so the Xml is not parsed the next time
+            sidecar = RelationsSidecar( file, RELATIONTABLES)
+            for relation in dr:
+                sidecar.append("relations", (sidecar.intern(relation.get_src()), sidecar.intern(relation.get_dest()), relation.get_similarity()))
+            sidecar.close( attr)
 
         return (dr, attr)
 
@@ -135,8 +207,8 @@ class DocumentRelations:
         Next relation
         :return:
         """
-        if self.id_index < len(self.relations):
-            relation = self.relations[self.id_index]
+        if self.id_index < len(self.srcs):
+            relation = self.get_relation(self.id_index)
             self.id_index += 1  # Ready for the next relation
             return relation
 
@@ -150,28 +222,50 @@ class DocumentRelations:
         :return:
         """
 
-        return len(self.relations)
+        return len(self.srcs)
 
 
 
     def get_relations_of(self, id):
         """
-        Get all relations with the given src id
+        Get all relations with the given src id, in the order they were added
         :param id:
         :return:
         """
 
+        src_index = self.id_to_index.get(id)
+        if src_index is None:
+            return []
+
         if self.is_dirty:
-            # Fill a dictionary with the src as key and all relations as values
-            self.per_src = {}
-            for rel in self.relations:
-                src = rel.get_src()
-                if not src in self.per_src:
-                    self.per_src[src] = []
-                self.per_src[src].append( rel)
+            # CSR style index, the rows of the relations of src i are per_src[per_src_offsets[i]:per_src_offsets[i+1]]
+            srcs = np.array(self.srcs, dtype=np.int32)
+            self.per_src = np.argsort(srcs, kind="stable")
+            self.per_src_offsets = np.searchsorted(srcs[self.per_src], np.arange(len(self.ids) + 1), side="left")
             self.is_dirty = False
 
-        return self.per_src[id] if id in self.per_src else []
+        return [self.get_relation(row) for row in self.per_src[self.per_src_offsets[src_index]:self.per_src_offsets[src_index + 1]].tolist()]
+
+
+    def __find(self, src, dest):
+        """
+        Find the row of the relation
+        :param src: id of the source article
+        :param dest: id of the destination article
+        :return: the row of the first relation between src and dest, None if it does not exist
+        """
+
+        src_index = self.id_to_index.get(src)
+        dest_index = self.id_to_index.get(dest)
+        if src_index is None or dest_index is None:
+            return None
+
+        if self.pair_index is None:
+            # The first relation of a pair is used, so fill the dictionary in reverse order
+            keys = (np.array(self.srcs, dtype=np.int32).astype(np.int64) << 32) | np.array(self.dests, dtype=np.int32)
+            self.pair_index = dict(zip(keys[::-1].tolist(), range(len(keys) - 1, -1, -1)))
+
+        return self.pair_index.get(DocumentRelations.__pair_key(src_index, dest_index))
 
 
     def get_similarity(self, src, dest):
@@ -181,11 +275,9 @@ class DocumentRelations:
         :param dest: id of the destination article
         :return: similarity, 0 if it does not exist
         """
-        for rel in self.relations:
-            if rel.get_src() == src  and  rel.get_dest() == dest:
-                return rel.get_similarity()
 
-        return 0
+        row = self.__find(src, dest)
+        return 0 if row is None else self.similarities[row]
 
 
     def pair_is_available(self, src, dest):
@@ -196,11 +288,7 @@ class DocumentRelations:
         :return:
         """
 
-        for rel in self.relations:
-            if rel.get_src() == src  and  rel.get_dest() == dest:
-                return True
-
-        return False
+        return not self.__find(src, dest) is None
 
 
 
@@ -209,4 +297,4 @@ class DocumentRelations:
         The number of relations
         :return:
         """
-        return len( self.relations)
\ No newline at end of file
+        return len( self.srcs)
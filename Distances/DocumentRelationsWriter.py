@@ -0,0 +1,94 @@
+# Class to write document relations while they are created, without keeping them in memory.
+# The Xml has the same form as DocumentRelations.save, next to it an optional binary sidecar is written
+import os
+import shutil
+from xml.sax.saxutils import escape, quoteattr
+
+from Distances.RelationsSidecar import RelationsSidecar
+
+
+RELATIONTABLES = {"relations": [("src", "<i4"), ("dest", "<i4"), ("similarity", "<f8")]}
+
+class DocumentRelationsWriter:
+    def __init__(self, filename, parameters=None, binary=True):
+        """
+        Open the writer, the relations are written to a temporary file, because the parameters
+        are written in the root element when the writer is closed
+        :param filename: the output file
+        :param parameters: dictionary of parameters, more can be set with set_parameter
+        :param binary: if true, the binary sidecar is written as well
+        """
+
+        self.filename = filename
+        self.parameters = dict(parameters) if not parameters is None else {}
+        self.body = open(filename + ".tmp", mode="w", encoding="utf-8")
+        self.sidecar = RelationsSidecar(filename, RELATIONTABLES) if binary else None
+        self.nr_of_relations = 0
+
+    def set_parameter(self, name, value):
+        """
+        Set a parameter that is written as attribute of the root node
+        :param name:
+        :param value: string
+        :return:
+        """
+        self.parameters[name] = value
+
+    def add(self, src, dest, similarity):
+        """
+        Write a document relation
+        :param src: source id
+        :param dest: destination id
+        :param similarity: the similarity (between 0 and 1)
+        :return:
+        """
+
+        self.body.write(f"<relation>\n  <src>{escape(src)}</src>\n  <dest>{escape(dest)}</dest>\n  <similarity>{similarity}</similarity>\n</relation>\n")
+        if not self.sidecar is None:
+            self.sidecar.append("relations", (self.sidecar.intern(src), self.sidecar.intern(dest), similarity))
+        self.nr_of_relations += 1
+
+    def count(self):
+        """
+        The number of relations written
+        :return:
+        """
+        return self.nr_of_relations
+
+    def close(self):
+        """
+        Write the Xml file with the parameters and the sidecar
+        :return:
+        """
+
+        self.body.close()
+        with open(self.filename, mode="w", encoding="utf-8-sig") as file:
+            attributes = "".join([f" {name}={quoteattr(str(value))}" for (name, value) in self.parameters.items()])
+            file.write(f"<relations{attributes}>\n")
+            with open(self.filename + ".tmp", mode="r", encoding="utf-8") as body:
+                shutil.copyfileobj(body, file)
+            file.write("</relations>\n")
+        os.remove(self.filename + ".tmp")
+
+        if not self.sidecar is None:
+            self.sidecar.close(self.parameters)
+
+    def abort(self):
+        """
+        Stop writing and remove the temporary files
+        :return:
+        """
+
+        self.body.close()
+        os.remove(self.filename + ".tmp")
+        if not self.sidecar is None:
+            self.sidecar.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -17,6 +17,8 @@ import pickle
 
 from tqdm import tqdm
 
+from Distances.DocumentSectionRelationsWriter import DocumentSectionRelationsWriter, SECTIONRELATIONTABLES
+from Distances.RelationsSidecar import RelationsSidecar
 from Distances.SectionRelations import SectionRelations
 from lxml import etree as ET
 import html
@@ -59,43 +61,68 @@ class DocumentSectionRelations:
         return []       # No relations
 
 
-    def save(self, filename):
+    def add_pair(self, src, dest, similarity, sections):
         """
-        Save the relations in the given Xml file
-        :param filename:the output file
-        :return:
+        Add a document relation together with the relations between the sections
+        :param src: id of source document
+        :param dest: id of destination document
+        :param similarity: the similarity (between 0 and 1)
+        :param sections: list of tuples (src section id, dest section id, similarity)
+        :return: the sectionrelations object
         """
 
-        file = open(filename, mode="w", encoding="utf-8-sig")
-        file.write("<sectionrelations>\n")
+        sectionrelations = self.add( src, dest, similarity)
+        sectionrelations.add_sections( [section[0] for section in sections], [section[1] for section in sections], [section[2] for section in sections])
 
-        for src_doc in self.relations.keys():
-            src_doc_node = ET.fromstring("<srcdoc></srcdoc>")
-            src_doc_node.attrib["id"] = src_doc
-            for dest_doc in self.relations[src_doc]:
-                dest_doc_node = ET.SubElement(src_doc_node, "destdoc", attrib={"id": dest_doc.get_dest(), "similarity" : str(dest_doc.get_similarity())})
-                for sect_relation in dest_doc.get_relations():
-                    ET.SubElement( dest_doc_node, "section", attrib={"src": sect_relation.get_src(), "dest": sect_relation.get_dest(), "similarity": str( sect_relation.get_similarity())})
+        return sectionrelations
 
-            file.write( functions.xml_as_string(src_doc_node))
-            del src_doc_node
 
-        # Write the end of the file
-        file.write("</sectionrelations>\n")
-        file.close()
+    def save(self, filename, binary=True):
+        """
+        Save the relations in the given Xml file
+        :param filename:the output file
+        :param binary: if true, a binary sidecar is written that is used by read
+        :return:
+        """
 
-        functions.write_pickle(filename, self.relations)
+        with DocumentSectionRelationsWriter(filename, binary=binary) as writer:
+            for src_doc in self.relations.keys():
+                for dest_doc in self.relations[src_doc]:
+                    sections = [(sect_relation.get_src(), sect_relation.get_dest(), sect_relation.get_similarity()) for sect_relation in dest_doc.get_relations()]
+                    writer.add_pair(src_doc, dest_doc.get_dest(), dest_doc.get_similarity(), sections)
 
 
     @staticmethod
     def read(file):
         """
         Returns a new DocumentSectionsRelations object filled with the info in the Xml file
+        The binary sidecar is used if it is available, otherwise it is created
         :param file: xml file, that was created with a save
         :return: DocumentSectionsRelations object
         """
 
-        drs = functions.read_from_pickle( file)
+        sidecar = RelationsSidecar.read( file, SECTIONRELATIONTABLES)
+        if not sidecar is None:
+            (ids, arrays, parameters) = sidecar
+            drs = DocumentSectionRelations({})
+            sections = arrays["sections"]
+            section_srcs = sections["src"].tolist()
+            section_dests = sections["dest"].tolist()
+            section_similarities = sections["similarity"].tolist()
+
+            start = 0
+            pairs = arrays["pairs"]
+            with tqdm(total=len(pairs), desc="Reading relations") as progress:
+                for (src, dest, similarity, nr_of_sections) in zip(pairs["src"].tolist(), pairs["dest"].tolist(), pairs["similarity"].tolist(), pairs["sections"].tolist()):
+                    end = start + nr_of_sections
+                    relations = drs.add( ids[src], ids[dest], similarity)
+                    relations.add_sections( [ids[index] for index in section_srcs[start:end]], [ids[index] for index in section_dests[start:end]], section_similarities[start:end])
+                    start = end
+                    progress.update()
+
+            return drs
+
+        drs = functions.read_from_pickle( file)    # Pickles written by older versions
         if drs is None:
             drs = DocumentSectionRelations({})
             print("Counting...")
@@ -108,12 +135,16 @@ class DocumentSectionRelations:
                             dest.add_section( section.attrib["src"], section.attrib["dest"], float( section.attrib["similarity"]))
                     progress.update()
 
-            functions.write_pickle( file, drs)
-        else:
-            if type(drs).__name__ == 'dict': drs = DocumentSectionRelations(drs)
-
-        return drs
-
-
+        elif type(drs).__name__ == 'dict':
+            drs = DocumentSectionRelations(drs)
 
+        # Write the sidecar, so the Xml is not parsed the next time
+        sidecar = RelationsSidecar( file, SECTIONRELATIONTABLES)
+        for (src, relations) in drs.relations.items():
+            for dest in relations:
+                sidecar.append("pairs", (sidecar.intern(src), sidecar.intern(dest.get_dest()), dest.get_similarity(), len(dest.get_relations())))
+                for section in dest.get_relations():
+                    sidecar.append("sections", (sidecar.intern(section.get_src()), sidecar.intern(section.get_dest()), section.get_similarity()))
+        sidecar.close( {})
 
+        return drs
@@ -0,0 +1,99 @@
+# Class to write document section relations while they are created, without keeping them in memory.
+# The Xml has the same form as DocumentSectionRelations.save, consecutive relations with the same source
+# are written in the same srcdoc element. Next to it an optional binary sidecar is written
+from xml.sax.saxutils import quoteattr
+
+from Distances.RelationsSidecar import RelationsSidecar
+
+
+SECTIONRELATIONTABLES = {
+    "pairs": [("src", "<i4"), ("dest", "<i4"), ("similarity", "<f8"), ("sections", "<i4")],
+    "sections": [("src", "<i4"), ("dest", "<i4"), ("similarity", "<f8")]
+}
+
+class DocumentSectionRelationsWriter:
+    def __init__(self, filename, binary=True):
+        """
+        Open the writer
+        :param filename: the output file
+        :param binary: if true, the binary sidecar is written as well
+        """
+
+        self.file = open(filename, mode="w", encoding="utf-8-sig")
+        self.file.write("<sectionrelations>\n")
+        self.sidecar = RelationsSidecar(filename, SECTIONRELATIONTABLES) if binary else None
+        self.current_src = None
+        self.nr_of_relations = 0
+
+    def add_pair(self, src, dest, similarity, sections):
+        """
+        Write the relation of two documents with the relations between their sections
+        :param src: id of source document
+        :param dest: id of destination document
+        :param similarity: the similarity (between 0 and 1)
+        :param sections: list of tuples (src section id, dest section id, similarity)
+        :return:
+        """
+
+        if src != self.current_src:
+            if not self.current_src is None:
+                self.file.write("</srcdoc>\n")
+            self.file.write(f"<srcdoc id={quoteattr(src)}>\n")
+            self.current_src = src
+
+        destdoc = f"  <destdoc id={quoteattr(dest)} similarity=\"{similarity}\""
+        if len(sections) == 0:
+            self.file.write(destdoc + "/>\n")
+        else:
+            lines = [destdoc + ">\n"]
+            for (src_section, dest_section, section_similarity) in sections:
+                lines.append(f"    <section src={quoteattr(src_section)} dest={quoteattr(dest_section)} similarity=\"{section_similarity}\"/>\n")
+            lines.append("  </destdoc>\n")
+            self.file.write("".join(lines))
+
+        if not self.sidecar is None:
+            self.sidecar.append("pairs", (self.sidecar.intern(src), self.sidecar.intern(dest), similarity, len(sections)))
+            for (src_section, dest_section, section_similarity) in sections:
+                self.sidecar.append("sections", (self.sidecar.intern(src_section), self.sidecar.intern(dest_section), section_similarity))
+
+        self.nr_of_relations += 1
+
+    def count(self):
+        """
+        The number of document relations written
+        :return:
+        """
+        return self.nr_of_relations
+
+    def close(self):
+        """
+        Write the end of the Xml file and the sidecar
+        :return:
+        """
+
+        if not self.current_src is None:
+            self.file.write("</srcdoc>\n")
+        self.file.write("</sectionrelations>\n")
+        self.file.close()
+
+        if not self.sidecar is None:
+            self.sidecar.close({})
+
+    def abort(self):
+        """
+        Stop writing, the sidecar is removed
+        :return:
+        """
+
+        self.file.close()
+        if not self.sidecar is None:
+            self.sidecar.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
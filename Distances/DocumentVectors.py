@@ -3,6 +3,7 @@ import gc
 import pickle
 
 from Distances.DocumentVector import DocumentVector
+from Distances.VectorStore import VectorStore
 from lxml import etree as ET
 import numpy as np
 import functions
@@ -10,7 +11,7 @@ import re
 
 class DocumentVectors:
     def __init__(self, vectors):
-        self.vectors = vectors
+        self.vectors = vectors  # Dictionary with the id as key and a DocumentVector as value, or a VectorStore
 
     def add(self, documentid, vector):
         """
@@ -37,6 +38,9 @@ class DocumentVectors:
         Read the vector size and check the file if all document vectors have the same size
         :return:
         """
+        if isinstance(self.vectors, VectorStore):
+            return self.vectors.get_vector_size()
+
         size = 0
         for vector in self.vectors.values():
             if size == 0:
@@ -51,15 +55,30 @@ class DocumentVectors:
 
     def save(self, filename):
         """
-        Save the vectors in the given Xml file
+        Save the vectors in the given Xml file, next to the Xml file a binary store is written
+        that is used by read
         :param file:the output file
         :return:
         """
 
+        DocumentVectors.write(filename, self.vectors.values())
+
+
+    @staticmethod
+    def write(filename, documentvectors):
+        """
+        Save the document vectors in the given Xml file and the binary store, the vectors are written one at a time
+        so they don't have to be in memory at once
+        :param filename: the output file
+        :param documentvectors: iterable of DocumentVector objects that can be iterated more than once, for
+                                example a VectorCheckpoint
+        :return:
+        """
+
         file = open(filename, mode="w", encoding="utf-8-sig")
         file.write("<documents>\n")
 
-        for vector in self.vectors.values():
+        for vector in documentvectors:
             vectorValue = vector.get_vector()
             if hasattr(vectorValue, '__iter__'):
                 document = ET.fromstring("<document></document>")
@@ -80,41 +99,44 @@ class DocumentVectors:
         file.write("</documents>\n")
         file.close()
 
-        # Write the file
-        functions.write_pickle(filename, self.vectors)
+        # Write the binary store
+        VectorStore.write(filename, documentvectors)
 
 
     @staticmethod
     def read(file, id_filter=None):
         """
-        Returns a new DocumentVectors object filled with the info in the Xml file
+        Returns a new DocumentVectors object filled with the info in the Xml file, the vectors are
+        memory mapped from the binary store that is created the first time the file is read
         :param file: xml file, that was created with a save
         :param id_filter: regular expression that filters the ids
         :return: DocumentVectors object
         """
 
-        dv = functions.read_from_pickle(file)
-        if dv is None:
-            dv = DocumentVectors({})
-            root = ET.parse(file).getroot()
-            for document in root:
-                id = document.find("id").text
-                if id_filter is None or id_filter.match( id):
+        store = VectorStore.open(file, id_filter=id_filter)
+        if store is None:
+            vectors = functions.read_from_pickle(file)   # Pickles written by older versions
+            if vectors is None:
+                vectors = {}
+                for document in functions.iterate_xml(file):
+                    id = document.find("id").text
                     if not document.find("vector").text is None:
-                        vector = [float(value) for value in document.find("vector").text.split(",")]
-                        dv.add( id, vector)
+                        documentvector = DocumentVector(id, [float(value) for value in document.find("vector").text.split(",")])
                         for section in (document.find("sections").findall("section")):
                             if not section.text is None:
-                                sectionvector = [float(value) for value in section.text.split(",")]
-                                dv.add_section( id, sectionvector)
-            functions.write_pickle( file, dv)
+                                documentvector.add_section([float(value) for value in section.text.split(",")])
+                        vectors[id] = documentvector
 
-            del root
+            elif type(vectors).__name__ == 'DocumentVectors':
+                vectors = vectors.vectors
 
-        else:
-            if type(dv).__name__ == 'dict': dv = DocumentVectors(dv)
+            VectorStore.write(file, vectors.values())
+            del vectors
+            gc.collect()
 
-        return dv
+            store = VectorStore.open(file, id_filter=id_filter)
+
+        return DocumentVectors(store)
 
 
     def get_numpy_dict(self):
@@ -135,6 +157,9 @@ class DocumentVectors:
         The indexes are the documentids in the rows
         :return: (indexes, matrix)
         """
+        if isinstance(self.vectors, VectorStore):
+            return self.vectors.get_document_matrix()
+
         indexes = []
         matrix = []
 
@@ -204,6 +229,20 @@ class DocumentVectors:
         else:
             return None
 
+    def get_section_matrix(self, id):
+        """
+        Get the section vectors of the document with the given id as a matrix
+        :param id:
+        :return: matrix with a row for every section, None if the document does not exist
+        """
+
+        if not id in self.vectors:
+            return None
+        elif isinstance(self.vectors, VectorStore):
+            return self.vectors.get_section_matrix(id)
+        else:
+            return np.array([vector for (index, vector) in self.vectors[id].get_sections()], dtype=np.float32).reshape(-1, self.vectors[id].get_vector_size())
+
     def documentvector_exists(self, id):
         """
         Determines wheather a document vector with this Id exists
@@ -0,0 +1,149 @@
+# Class to write and read the compact binary version of a relations file. It is a directory next to
+# the Xml file (<name>.binary) containing
+#   ids.txt          the interned ids (documents and sections), one per line, the line number is the index
+#   <table>.bin      a numpy structured array for every table, records are appended while writing
+#   parameters.json  the parameters of the relations file, written last, it marks the sidecar as complete
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class RelationsSidecar:
+
+    IDS = "ids.txt"
+    PARAMETERS = "parameters.json"
+    BUFFERSIZE = 65536  # Number of records that are buffered per table before they are written
+
+    def __init__(self, file, tables):
+        """
+        Create a new sidecar for the file, the records are written in a temporary directory until close is called
+        :param file: the (xml) file the sidecar belongs to
+        :param tables: dictionary with the name of the table as key and the numpy dtype of the records as value
+        """
+
+        self.directory = RelationsSidecar.directory_of(file)
+        self.tmp_directory = self.directory + ".tmp"
+        if os.path.exists(self.tmp_directory):
+            shutil.rmtree(self.tmp_directory)
+        os.makedirs(self.tmp_directory)
+
+        self.ids_file = open(os.path.join(self.tmp_directory, RelationsSidecar.IDS), mode="w", encoding="utf-8")
+        self.id_to_index = {}
+        self.tables = {}
+        for (name, dtype) in tables.items():
+            self.tables[name] = (np.dtype(dtype), open(os.path.join(self.tmp_directory, name + ".bin"), "wb"), [])
+
+
+    @staticmethod
+    def directory_of(file):
+        """
+        Determine the directory of the sidecar that belongs to the (xml) file
+        :param file:
+        :return:
+        """
+
+        return os.path.splitext(file)[0] + ".binary"
+
+
+    def intern(self, id):
+        """
+        Returns the index of the id, new ids are added to the ids file
+        :param id:
+        :return:
+        """
+
+        index = self.id_to_index.get(id)
+        if index is None:
+            index = len(self.id_to_index)
+            self.id_to_index[id] = index
+            self.ids_file.write(id + "\n")
+
+        return index
+
+
+    def append(self, table, record):
+        """
+        Append a record to the table
+        :param table: name of the table
+        :param record: tuple with the values of the record
+        :return:
+        """
+
+        (dtype, file, buffer) = self.tables[table]
+        buffer.append(record)
+        if len(buffer) >= RelationsSidecar.BUFFERSIZE:
+            self.__flush(table)
+
+
+    def __flush(self, table):
+        """
+        Write the buffered records of the table
+        :param table:
+        :return:
+        """
+
+        (dtype, file, buffer) = self.tables[table]
+        if len(buffer) > 0:
+            np.array(buffer, dtype=dtype).tofile(file)
+            buffer.clear()
+
+
+    def close(self, parameters):
+        """
+        Write the remaining records and the parameters and replace the previous sidecar
+        :param parameters: dictionary with the parameters
+        :return:
+        """
+
+        for table in self.tables.keys():
+            self.__flush(table)
+            self.tables[table][1].close()
+        self.ids_file.close()
+
+        with open(os.path.join(self.tmp_directory, RelationsSidecar.PARAMETERS), mode="w", encoding="utf-8") as parameters_file:
+            json.dump(parameters, parameters_file)
+
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.rename(self.tmp_directory, self.directory)
+
+
+    def abort(self):
+        """
+        Stop writing and remove the temporary files
+        :return:
+        """
+
+        for (dtype, file, buffer) in self.tables.values():
+            file.close()
+        self.ids_file.close()
+        shutil.rmtree(self.tmp_directory)
+
+
+    @staticmethod
+    def read(file, tables):
+        """
+        Read the sidecar that belongs to the file, if it is not older than the file
+        :param file: the (xml) file the sidecar belongs to
+        :param tables: dictionary with the name of the table as key and the numpy dtype of the records as value
+        :return: tuple (ids, dictionary with a numpy array per table, parameters) or None if there is no (recent) sidecar
+        """
+
+        directory = RelationsSidecar.directory_of(file)
+        parameters_file = os.path.join(directory, RelationsSidecar.PARAMETERS)
+        if not os.path.isfile(parameters_file) or (os.path.exists(file) and os.path.getmtime(parameters_file) < os.path.getmtime(file)):
+            return None
+
+        with open(parameters_file, mode="r", encoding="utf-8") as parameters_file:
+            parameters = json.load(parameters_file)
+
+        with open(os.path.join(directory, RelationsSidecar.IDS), mode="r", encoding="utf-8") as ids_file:
+            ids = ids_file.read().splitlines()
+
+        arrays = {}
+        for (name, dtype) in tables.items():
+            arrays[name] = np.fromfile(os.path.join(directory, name + ".bin"), dtype=np.dtype(dtype))
+
+        return (ids, arrays, parameters)
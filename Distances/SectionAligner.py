@@ -0,0 +1,115 @@
+# Class that aligns the sections of many document pairs at once. The section matrices of a batch of pairs
+# are stacked (padded to the largest document), so the similarities and the nearest neighbours of all pairs
+# are computed with a few numpy operations
+import numpy as np
+
+
+BATCHSIZE = 256     # Number of document pairs aligned at once
+
+class SectionAligner:
+    def __init__(self, documentvectors, K, minimal_similarity, batch_size=BATCHSIZE):
+        """
+        Initialization
+        :param documentvectors: DocumentVectors object containing the section vectors
+        :param K: the number of nearest neighbours of every section
+        :param minimal_similarity: minimal similarity of two sections
+        :param batch_size: the number of pairs aligned at once
+        """
+
+        self.documentvectors = documentvectors
+        self.K = K
+        self.minimal_similarity = minimal_similarity
+        self.batch_size = batch_size
+        self.vector_size = documentvectors.get_vector_size()
+
+
+    def align(self, pairs):
+        """
+        Determine the Nearest Neighbours of the sections of every pair as described in
+        "Large-scale Hierarchical Alignment for Data-driven Text Rewriting", Nikola I. Nikolov et al. section 3.2
+        A section relation is selected when the destination section is one of the K nearest neighbours of the source
+        section, or the other way around, and the similarity is at least the minimal similarity
+        :param pairs: iterable of tuples (src id, dest id)
+        :return: generator with a tuple (src_indexes, dest_indexes, similarities) for every pair, in the same order
+        """
+
+        batch = []
+        for pair in pairs:
+            batch.append(pair)
+            if len(batch) >= self.batch_size:
+                yield from self.__align_batch(batch)
+                batch = []
+
+        if len(batch) > 0:
+            yield from self.__align_batch(batch)
+
+
+    def __align_batch(self, batch):
+        """
+        Align the sections of all pairs in the batch
+        :param batch: list of tuples (src id, dest id)
+        :return: generator with a tuple (src_indexes, dest_indexes, similarities) for every pair
+        """
+
+        matrices = [(self.__normalized_sections(src), self.__normalized_sections(dest)) for (src, dest) in batch]
+        max_src = max([src.shape[0] for (src, dest) in matrices])
+        max_dest = max([dest.shape[0] for (src, dest) in matrices])
+
+        # Stack the matrices, padded with zeros
+        src_stack = np.zeros((len(batch), max_src, self.vector_size), dtype=np.float32)
+        dest_stack = np.zeros((len(batch), max_dest, self.vector_size), dtype=np.float32)
+        valid = np.zeros((len(batch), max_src, max_dest), dtype=bool)
+        for (pair_index, (src, dest)) in enumerate(matrices):
+            src_stack[pair_index, :src.shape[0]] = src
+            dest_stack[pair_index, :dest.shape[0]] = dest
+            valid[pair_index, :src.shape[0], :dest.shape[0]] = True
+
+        similarities = np.matmul(src_stack, dest_stack.transpose(0, 2, 1))
+        similarities[~valid] = -np.inf
+
+        selected = self.__top_k_mask(similarities, axis=2) | self.__top_k_mask(similarities, axis=1)
+        selected &= similarities >= self.minimal_similarity
+
+        (pair_indexes, src_indexes, dest_indexes) = np.nonzero(selected)
+        values = similarities[pair_indexes, src_indexes, dest_indexes]
+        bounds = np.searchsorted(pair_indexes, np.arange(len(batch) + 1))
+        for pair_index in range(len(batch)):
+            (start, end) = (bounds[pair_index], bounds[pair_index + 1])
+            yield (src_indexes[start:end], dest_indexes[start:end], values[start:end])
+
+
+    def __top_k_mask(self, similarities, axis):
+        """
+        Returns a mask of the K largest values along the axis
+        :param similarities: matrix with the similarities of the batch
+        :param axis: 2 for the nearest neighbours of the source sections, 1 for the destination sections
+        :return: boolean matrix
+        """
+
+        if self.K >= similarities.shape[axis]:
+            return np.ones(similarities.shape, dtype=bool)
+
+        mask = np.zeros(similarities.shape, dtype=bool)
+        if self.K > 0:
+            nearest = np.take(np.argpartition(-similarities, self.K - 1, axis=axis), range(self.K), axis=axis)
+            np.put_along_axis(mask, nearest, True, axis=axis)
+
+        return mask
+
+
+    def __normalized_sections(self, id):
+        """
+        Returns the section vectors of the document as unit vectors
+        :param id:
+        :return: matrix with a row for every section
+        """
+
+        sections = self.documentvectors.get_section_matrix(id)
+        if sections is None:
+            return np.zeros((0, self.vector_size), dtype=np.float32)
+
+        sections = np.array(sections, dtype=np.float32)
+        norms = np.linalg.norm(sections, axis=1)
+        norms[norms == 0] = 1.0
+
+        return sections / norms[:, None]
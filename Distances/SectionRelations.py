@@ -29,6 +29,17 @@ class SectionRelations:
         rel = SectionRelation( src, dest, similarity)
         self.relations.append( rel)
 
+    def add_sections(self, srcs, dests, similarities):
+        """
+        Add a list of section relations at once
+        :param srcs: list of source ids of the sections
+        :param dests: list of destination ids of the sections
+        :param similarities: list of similarities
+        :return:
+        """
+
+        self.relations.extend([SectionRelation( src, dest, similarity) for (src, dest, similarity) in zip(srcs, dests, similarities)])
+
     def get_dest(self):
         """
         The id of the destination
@@ -0,0 +1,105 @@
+# Class to write the document vectors to disk while they are created, so a long running job can be resumed.
+# The checkpoint file contains a sequence of pickled lists, every list contains the vectors that were added
+# since the previous checkpoint. The vectors are stored as they are (lists or numpy arrays with their dtype), so a
+# resumed run creates the same vectors file as an uninterrupted run. A list that was not completely written
+# (crash during the write) is ignored. The vectors are read one list at a time, so the checkpoint does not
+# have to fit in memory
+import os
+import pickle
+
+from Distances.DocumentVector import DocumentVector
+
+
+class VectorCheckpoint:
+
+    def __init__(self, file):
+        """
+        Checkpoint in the given file
+        :param file:
+        """
+        self.file = file
+
+
+    def read_ids(self):
+        """
+        Read the ids of the document vectors in the checkpoint, a partially written last list is removed from the file
+        :return: list of ids
+        """
+
+        ids = []
+        if not os.path.isfile(self.file):
+            return ids
+
+        with open(self.file, "r+b") as checkpoint:
+            valid_size = 0
+            for records in VectorCheckpoint.__read_lists(checkpoint):
+                valid_size = checkpoint.tell()
+                ids.extend([id for (id, vector, sections) in records])
+
+            checkpoint.truncate(valid_size)
+
+        return ids
+
+
+    def __iter__(self):
+        """
+        Iterate through the document vectors in the checkpoint, every iteration reads the file again
+        :return: generator of DocumentVector objects
+        """
+
+        if not os.path.isfile(self.file):
+            return
+
+        with open(self.file, "rb") as checkpoint:
+            for records in VectorCheckpoint.__read_lists(checkpoint):
+                for (id, vector, sections) in records:
+                    documentvector = DocumentVector(id, vector)
+                    for section in sections:
+                        documentvector.add_section(section)
+                    yield documentvector
+
+
+    @staticmethod
+    def __read_lists(checkpoint):
+        """
+        Read the complete lists of the checkpoint
+        :param checkpoint: the opened file
+        :return: generator of lists of tuples (id, vector, section vectors)
+        """
+
+        while True:
+            try:
+                yield pickle.load(checkpoint)
+            except (EOFError, pickle.UnpicklingError, ValueError):
+                return
+
+
+    def append(self, documentvectors):
+        """
+        Append the document vectors to the checkpoint, the data is on disk when the method returns
+        :param documentvectors: list of DocumentVector objects
+        :return:
+        """
+
+        if len(documentvectors) == 0:
+            return
+
+        records = []
+        for documentvector in documentvectors:
+            sections = [section for (index, section) in documentvector.get_sections()]
+            records.append((documentvector.get_id(), documentvector.get_vector(), sections))
+
+        with open(self.file, "ab") as checkpoint:
+            pickle.dump(records, checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+
+    def remove(self):
+        """
+        Remove the checkpoint file
+        :return:
+        """
+
+        if os.path.isfile(self.file):
+            os.remove(self.file)
@@ -0,0 +1,246 @@
+# Class to store the document and section vectors in a binary format that can be memory mapped
+# The store is a directory next to the Xml file (<name>.store) containing
+#   documents.npy   float32 matrix with a row for every document
+#   sections.npy    float32 matrix with a row for every section of every document
+#   offsets.npy     int64 array, the sections of document i are the rows offsets[i]:offsets[i+1]
+#   ids.txt         the document ids, one per line in the order of the rows
+#   hash.txt        the hash of the contents, written the first time it is needed
+import os
+import shutil
+from collections.abc import Mapping
+
+import numpy as np
+
+import functions
+from Distances.DocumentVector import DocumentVector
+
+
+class VectorStore(Mapping):
+
+    DOCUMENTS = "documents.npy"
+    SECTIONS = "sections.npy"
+    OFFSETS = "offsets.npy"
+    IDS = "ids.txt"
+    HASH = "hash.txt"
+
+    def __init__(self, directory, id_filter=None):
+        """
+        Open the store with memory mapping, nothing is read into memory except for the ids
+        :param directory: the directory of the store
+        :param id_filter: regular expression that filters the ids
+        """
+        self.directory = directory
+        self.documents = np.load(os.path.join(directory, VectorStore.DOCUMENTS), mmap_mode="r")
+        self.sections = np.load(os.path.join(directory, VectorStore.SECTIONS), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, VectorStore.OFFSETS), mmap_mode="r")
+
+        with open(os.path.join(directory, VectorStore.IDS), mode="r", encoding="utf-8") as file:
+            ids = file.read().splitlines()
+
+        # The rows of the documents that are visible through this store
+        if id_filter is None:
+            self.ids = ids
+            self.rows = None
+        else:
+            selected = [(row, id) for (row, id) in enumerate(ids) if id_filter.match(id)]
+            self.ids = [id for (row, id) in selected]
+            self.rows = np.array([row for (row, id) in selected], dtype=np.int64)
+
+        self.id_to_row = {id: (index if self.rows is None else int(self.rows[index])) for (index, id) in enumerate(self.ids)}
+
+
+    @staticmethod
+    def directory_of(file):
+        """
+        Determine the directory of the store that belongs to the (xml) file
+        :param file:
+        :return:
+        """
+
+        return os.path.splitext(file)[0] + ".store"
+
+
+    @staticmethod
+    def exists_for(file):
+        """
+        Checks whether a store exists for the file, that is newer than the file itself
+        :param file:
+        :return:
+        """
+
+        directory = VectorStore.directory_of(file)
+        ids_file = os.path.join(directory, VectorStore.IDS)
+        if not os.path.isfile(ids_file):
+            return False
+
+        return not os.path.exists(file) or os.path.getmtime(file) < os.path.getmtime(ids_file)
+
+
+    @staticmethod
+    def open(file, id_filter=None):
+        """
+        Open the store that belongs to the file
+        :param file: the (xml) file with the document vectors
+        :param id_filter: regular expression that filters the ids
+        :return: VectorStore object or None if there is no (recent) store
+        """
+
+        if VectorStore.exists_for(file):
+            return VectorStore(VectorStore.directory_of(file), id_filter=id_filter)
+        else:
+            return None
+
+
+    @staticmethod
+    def write(file, documentvectors):
+        """
+        Write the document vectors into a store that belongs to the file, the matrices are
+        filled row by row so they don't need to fit in memory twice
+        :param file: the (xml) file with the document vectors
+        :param documentvectors: iterable of DocumentVector objects that can be iterated more than once, the first
+                                iteration determines the size of the matrices
+        :return: the directory of the store
+        """
+
+        nr_of_vectors = 0
+        nr_of_sections = 0
+        size = 0
+        for vector in documentvectors:
+            if hasattr(vector.get_vector(), '__iter__'):
+                if nr_of_vectors == 0:
+                    size = len(vector.get_vector())
+                nr_of_vectors += 1
+                nr_of_sections += len(vector.get_sections())
+        vectors = (vector for vector in documentvectors if hasattr(vector.get_vector(), '__iter__'))
+
+        directory = VectorStore.directory_of(file)
+        tmp_directory = directory + ".tmp"
+        if os.path.exists(tmp_directory):
+            shutil.rmtree(tmp_directory)
+        os.makedirs(tmp_directory)
+
+        documents = np.lib.format.open_memmap(os.path.join(tmp_directory, VectorStore.DOCUMENTS), mode="w+", dtype=np.float32, shape=(nr_of_vectors, size))
+        sections = np.lib.format.open_memmap(os.path.join(tmp_directory, VectorStore.SECTIONS), mode="w+", dtype=np.float32, shape=(nr_of_sections, size))
+        offsets = np.zeros(nr_of_vectors + 1, dtype=np.int64)
+
+        ids = []
+        section_row = 0
+        for (row, vector) in enumerate(vectors):
+            documents[row] = vector.get_vector()
+            for (section_index, section_vector) in vector.get_sections():
+                sections[section_row] = section_vector
+                section_row += 1
+            offsets[row + 1] = section_row
+            ids.append(vector.get_id())
+
+        documents.flush()
+        sections.flush()
+        del documents
+        del sections
+        np.save(os.path.join(tmp_directory, VectorStore.OFFSETS), offsets)
+
+        # The ids are written last, they mark the store as complete
+        with open(os.path.join(tmp_directory, VectorStore.IDS), mode="w", encoding="utf-8") as ids_file:
+            for id in ids:
+                ids_file.write(id + "\n")
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.rename(tmp_directory, directory)
+
+        return directory
+
+
+    def get_vector_size(self):
+        """
+        The size of the vectors in the store
+        :return:
+        """
+        return self.documents.shape[1]
+
+
+    def get_content_hash(self):
+        """
+        Returns a hash of the contents of the visible documents, the hash of the whole store is
+        calculated once and saved in the store
+        :return:
+        """
+
+        hash_file = os.path.join(self.directory, VectorStore.HASH)
+        if os.path.isfile(hash_file):
+            content_hash = functions.read_file(hash_file).strip()
+        else:
+            content_hash = functions.hash_files([os.path.join(self.directory, VectorStore.DOCUMENTS), os.path.join(self.directory, VectorStore.IDS)])
+            functions.write_file(hash_file, content_hash)
+
+        if self.rows is None:
+            return content_hash
+        else:
+            return functions.hash_string(content_hash + "\n" + "\n".join(self.ids))
+
+
+    def get_row_of_id(self, id):
+        """
+        Returns the row in the documents matrix of the document with the given id
+        :param id:
+        :return: the row or None if the id does not exist
+        """
+        return self.id_to_row.get(id)
+
+
+    def get_document_matrix(self):
+        """
+        Returns the matrix of the visible documents, without copying if no filter is used
+        :return: (ids, matrix)
+        """
+
+        if self.rows is None:
+            return (self.ids, self.documents)
+        else:
+            return (self.ids, np.asarray(self.documents[self.rows]))
+
+
+    def get_document_file(self):
+        """
+        Returns the npy file with the document matrix, so other processes can memory map it as well
+        :return: (file, rows) where rows are the rows of the visible documents, None for all rows
+        """
+        return (os.path.join(self.directory, VectorStore.DOCUMENTS), self.rows)
+
+
+    def get_section_matrix(self, id):
+        """
+        Returns the matrix with the section vectors of the document, this is a view on the memory map
+        :param id:
+        :return: matrix with a row for every section
+        """
+
+        row = self.id_to_row[id]
+        return self.sections[self.offsets[row]:self.offsets[row + 1]]
+
+
+    def __getitem__(self, id):
+        """
+        Create a DocumentVector that uses views on the memory map
+        :param id:
+        :return:
+        """
+
+        row = self.id_to_row[id]
+        documentvector = DocumentVector(id, self.documents[row])
+        for section_vector in self.sections[self.offsets[row]:self.offsets[row + 1]]:
+            documentvector.add_section(section_vector)
+
+        return documentvector
+
+
+    def __contains__(self, id):
+        return id in self.id_to_row
+
+
+    def __iter__(self):
+        return iter(self.ids)
+
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,257 @@
+# Class for a directed graph in compressed sparse row (CSR) form. The destinations of node i are
+# indices[indptr[i]:indptr[i+1]], sorted and without duplicates. Both arrays are int32 (indptr becomes
+# int64 when there are more than 2^31 edges) and stored as .npy files in a directory, they are opened
+# with memory mapping so a large graph is available at once
+import os
+
+import numpy as np
+
+
+class CSRGraph:
+
+    INDPTR = "indptr.npy"
+    INDICES = "indices.npy"
+    CHUNKSIZE = 1 << 22     # Maximum number of destinations that are compared at once by count_common_neighbors_batch
+
+    def __init__(self, indptr, indices):
+        """
+        Create the graph from the CSR arrays
+        :param indptr: array with nr_of_nodes + 1 offsets in indices
+        :param indices: array with the sorted destinations of all nodes
+        """
+
+        self.indptr = indptr
+        self.indices = indices
+
+
+    @staticmethod
+    def from_edges(sources, destinations, nr_of_nodes):
+        """
+        Create the graph from a list of edges, duplicate edges are removed
+        :param sources: array like with the source of every edge
+        :param destinations: array like with the destination of every edge
+        :param nr_of_nodes: the number of nodes in the graph
+        :return: CSRGraph
+        """
+
+        sources = np.asarray(sources, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int32)
+
+        # Sort by source and destination, and remove duplicate edges
+        keys = np.unique((sources << 32) | destinations.astype(np.int64))
+        sources = (keys >> 32).astype(np.int32)
+        indices = (keys & 0xFFFFFFFF).astype(np.int32)
+
+        indptr = np.zeros(nr_of_nodes + 1, dtype=np.int32 if len(indices) <= np.iinfo(np.int32).max else np.int64)
+        np.cumsum(np.bincount(sources, minlength=nr_of_nodes), out=indptr[1:])
+
+        return CSRGraph(indptr, indices)
+
+
+    @staticmethod
+    def from_adjacency_lists(adjacency_lists):
+        """
+        Create the graph from a list with the destinations of every node
+        :param adjacency_lists: list with an iterable of destinations per node
+        :return: CSRGraph
+        """
+
+        lengths = np.fromiter((len(destinations) for destinations in adjacency_lists), dtype=np.int64, count=len(adjacency_lists))
+        sources = np.repeat(np.arange(len(adjacency_lists), dtype=np.int64), lengths)
+        destinations = np.fromiter((destination for destinations in adjacency_lists for destination in destinations), dtype=np.int32, count=int(lengths.sum()))
+
+        return CSRGraph.from_edges(sources, destinations, len(adjacency_lists))
+
+
+    @staticmethod
+    def exists(directory):
+        """
+        Checks whether the directory contains a saved graph
+        :param directory:
+        :return:
+        """
+
+        return os.path.isfile(os.path.join(directory, CSRGraph.INDPTR)) and os.path.isfile(os.path.join(directory, CSRGraph.INDICES))
+
+
+    @staticmethod
+    def load(directory):
+        """
+        Open a saved graph with memory mapping
+        :param directory:
+        :return: CSRGraph
+        """
+
+        indptr = np.load(os.path.join(directory, CSRGraph.INDPTR), mmap_mode="r")
+        indices = np.load(os.path.join(directory, CSRGraph.INDICES), mmap_mode="r")
+        return CSRGraph(indptr, indices)
+
+
+    def save(self, directory):
+        """
+        Save the graph in the directory, the indptr file is written last so a partially saved graph is not used
+        :param directory:
+        :return: None
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        for (name, data) in [(CSRGraph.INDICES, self.indices), (CSRGraph.INDPTR, self.indptr)]:
+            file = os.path.join(directory, name)
+            with open(file + ".tmp", "wb") as npy_file:
+                np.save(npy_file, data)
+            os.replace(file + ".tmp", file)
+
+
+    def __len__(self):
+        """
+        The number of nodes
+        :return:
+        """
+        return len(self.indptr) - 1
+
+
+    def get_number_of_edges(self):
+        """
+        Returns the number of edges
+        :return:
+        """
+        return len(self.indices)
+
+
+    def neighbors(self, node):
+        """
+        Returns the sorted destinations of the node
+        :param node:
+        :return: int32 array
+        """
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+
+    def degree(self, node):
+        """
+        Returns the number of destinations of the node
+        :param node:
+        :return:
+        """
+        return int(self.indptr[node + 1] - self.indptr[node])
+
+
+    def get_degrees(self):
+        """
+        Returns the number of destinations of every node
+        :return: array
+        """
+        return np.diff(self.indptr)
+
+
+    def count_common_neighbors(self, node1, node2):
+        """
+        Count the destinations the nodes have in common, the smaller sorted list is searched in the larger one
+        :param node1:
+        :param node2:
+        :return:
+        """
+
+        A = self.neighbors(node1)
+        B = self.neighbors(node2)
+        if len(A) > len(B):
+            (A, B) = (B, A)
+        if len(A) == 0:
+            return 0
+
+        positions = np.searchsorted(B, A)
+        positions[positions == len(B)] = 0
+        return int(np.count_nonzero(B[positions] == A))
+
+
+    def count_common_neighbors_batch(self, nodes1, nodes2):
+        """
+        Count the destinations the nodes have in common for every pair of nodes. The destinations of the pairs are
+        combined with the position of the pair into sorted keys, so the destinations of many pairs are intersected
+        with one search of the first keys in the second keys
+        :param nodes1: array like with the first node of every pair
+        :param nodes2: array like with the second node of every pair
+        :return: int64 array with the number of common destinations of every pair
+        """
+
+        nodes1 = np.asarray(nodes1, dtype=np.int64)
+        nodes2 = np.asarray(nodes2, dtype=np.int64)
+        counts = np.zeros(len(nodes1), dtype=np.int64)
+
+        # The pairs are compared in chunks of about CHUNKSIZE destinations
+        degrees = self.get_degrees()
+        total = np.cumsum(degrees[nodes1].astype(np.int64) + degrees[nodes2].astype(np.int64))
+        start = 0
+        while start < len(nodes1):
+            offset = total[start - 1] if start > 0 else 0
+            stop = max(int(np.searchsorted(total, offset + CSRGraph.CHUNKSIZE, side="right")), start + 1)
+
+            keys1 = self.__neighbor_keys(nodes1[start:stop])
+            keys2 = self.__neighbor_keys(nodes2[start:stop])
+            if len(keys1) > 0 and len(keys2) > 0:
+                positions = np.minimum(np.searchsorted(keys2, keys1), len(keys2) - 1)
+                common = keys1[keys2[positions] == keys1]
+                counts[start:stop] = np.bincount(common >> 32, minlength=stop - start)
+            start = stop
+
+        return counts
+
+
+    def __neighbor_keys(self, nodes):
+        """
+        Returns the destinations of the nodes as keys (position of the node << 32) | destination, the keys are sorted
+        because the destinations of every node are sorted
+        :param nodes: int64 array with the nodes
+        :return: int64 array with the keys
+        """
+
+        starts = self.indptr[nodes].astype(np.int64)
+        lengths = self.indptr[nodes + 1].astype(np.int64) - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()), dtype=np.int64)
+        positions = np.repeat(np.arange(len(nodes), dtype=np.int64), lengths)
+        return (positions << 32) | np.asarray(self.indices[offsets], dtype=np.int64)
+
+
+    def bfs_distances(self, source, targets, max_depth, excluded=None):
+        """
+        Determine the distances from the source to the targets with one breadth first search, the search stops
+        when all targets are found or the maximum depth is reached
+        :param source: the start node
+        :param targets: array like with the target nodes
+        :param max_depth: the maximum distance that is searched
+        :param excluded: boolean array with the nodes that are not part of the graph, or None
+        :return: int64 array with the distance to every target, -1 if the target can not be reached within max_depth
+        """
+
+        targets = np.asarray(targets, dtype=np.int64)
+        distances = np.full(len(targets), -1, dtype=np.int64)
+        visited = np.zeros(len(self), dtype=bool) if excluded is None else np.array(excluded, dtype=bool)
+
+        # The targets that are not found yet
+        remaining = np.zeros(len(self), dtype=bool)
+        remaining[targets] = True
+        remaining &= ~visited
+        to_find = int(np.count_nonzero(remaining))
+
+        frontier = np.array([source], dtype=np.int64)
+        visited[source] = True
+        depth = 0
+        while True:
+            found = frontier[remaining[frontier]]
+            if len(found) > 0:
+                remaining[found] = False
+                distances[np.isin(targets, found)] = depth
+                to_find -= len(found)
+            if to_find == 0 or depth == max_depth or len(frontier) == 0:
+                break
+
+            # All neighbors of the frontier that are not visited yet
+            starts = self.indptr[frontier].astype(np.int64)
+            lengths = self.indptr[frontier + 1].astype(np.int64) - starts
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()), dtype=np.int64)
+            neighbors = np.asarray(self.indices[offsets])
+            frontier = np.unique(neighbors[~visited[neighbors]]).astype(np.int64)
+            visited[frontier] = True
+            depth += 1
+
+        return distances
@@ -0,0 +1,140 @@
+# Class for a persistent cache of the shortest path distances in a WikiGraph, stored in a SQLite database.
+# A distance is stored with the variant of the graph (the maximum degree and the removed nodes), the source
+# and the target id. New distances are committed in batches. The database can be used by several processes
+# at the same time
+import sqlite3
+
+import functions
+
+
+class DistanceCache:
+
+    COMMITSIZE = 100    # Number of new distances that are committed at once
+    CHUNKSIZE = 400     # Maximum number of pairs in one query
+
+    def __init__(self, file, variant, commit_size=COMMITSIZE):
+        """
+        Open or create the cache
+        :param file: the SQLite database file
+        :param variant: string that identifies the graph the distances belong to
+        :param commit_size: the number of new distances that are committed at once
+        """
+
+        self.file = file
+        self.variant = variant
+        self.commit_size = commit_size
+        self.hits = 0
+        self.misses = 0
+        self.uncommitted = 0
+
+        functions.create_directory_for_file_if_not_exists(file)
+        self.connection = sqlite3.connect(file, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")      # Readers and a writer at the same time
+        self.connection.execute("CREATE TABLE IF NOT EXISTS distances (variant TEXT NOT NULL, src INTEGER NOT NULL, target INTEGER NOT NULL, distance INTEGER NOT NULL, PRIMARY KEY (variant, src, target)) WITHOUT ROWID")
+        self.connection.commit()
+
+
+    @staticmethod
+    def create_key(src, target):
+        """
+        Create the key of a pair, the graph is undirected so the smallest id is the source
+        :param src:
+        :param target:
+        :return: tuple (src, target)
+        """
+
+        return (src, target) if src <= target else (target, src)
+
+
+    def get(self, src, target):
+        """
+        Returns the distance between the nodes
+        :param src: graph id of the source
+        :param target: graph id of the target
+        :return: the distance, None if it is not in the cache
+        """
+
+        row = self.connection.execute("SELECT distance FROM distances WHERE variant = ? AND src = ? AND target = ?", (self.variant,) + DistanceCache.create_key(src, target)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return row[0]
+
+
+    def get_many(self, pairs):
+        """
+        Returns the distances of the pairs that are in the cache
+        :param pairs: list of tuples (src, target) with graph ids
+        :return: dictionary with the key of the pair (see create_key) as key and the distance as value
+        """
+
+        found = {}
+        keys = list(set([DistanceCache.create_key(src, target) for (src, target) in pairs]))
+        for chunk in functions.create_chunks_of_list(keys, DistanceCache.CHUNKSIZE):
+            query = f"SELECT src, target, distance FROM distances WHERE variant = ? AND ({' OR '.join(['(src = ? AND target = ?)'] * len(chunk))})"
+            parameters = [self.variant] + [id for key in chunk for id in key]
+            for (src, target, distance) in self.connection.execute(query, parameters):
+                found[(src, target)] = distance
+
+        self.hits += sum([1 for (src, target) in pairs if DistanceCache.create_key(src, target) in found])
+        self.misses += sum([1 for (src, target) in pairs if not DistanceCache.create_key(src, target) in found])
+        return found
+
+
+    def put(self, src, target, distance):
+        """
+        Add a distance to the cache, it is committed when there are enough new distances
+        :param src: graph id of the source
+        :param target: graph id of the target
+        :param distance:
+        :return:
+        """
+
+        self.put_many([(src, target, distance)])
+
+
+    def put_many(self, distances):
+        """
+        Add distances to the cache, they are committed when there are enough new distances
+        :param distances: list of tuples (src, target, distance)
+        :return:
+        """
+
+        rows = [(self.variant,) + DistanceCache.create_key(src, target) + (distance,) for (src, target, distance) in distances]
+        self.connection.executemany("INSERT OR REPLACE INTO distances (variant, src, target, distance) VALUES (?, ?, ?, ?)", rows)
+
+        self.uncommitted += len(rows)
+        if self.uncommitted >= self.commit_size:
+            self.commit()
+
+
+    def commit(self):
+        """
+        Commit the new distances
+        :return:
+        """
+
+        self.connection.commit()
+        self.uncommitted = 0
+
+
+    def get_statistics(self):
+        """
+        Returns the statistics of the cache in this process
+        :return: dictionary with the number of hits and misses and the hit rate
+        """
+
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitrate": float(self.hits) / total if total > 0 else 0.0}
+
+
+    def close(self):
+        """
+        Commit the new distances and close the database
+        :return:
+        """
+
+        self.commit()
+        self.connection.close()
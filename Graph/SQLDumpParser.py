@@ -0,0 +1,173 @@
+# Class to read the values of the INSERT statements in a MySQL dump of Wikipedia (page.sql, pagelinks.sql).
+# Every INSERT line is split into tuples by a regular expression that handles quoted strings with escaped
+# characters, commas and parentheses. A plain dump is divided in byte ranges that are parsed in a pool of
+# processes; the lines of a gzipped dump are read in this process and parsed in the pool. The results are
+# returned in the order of the dump, the number of tasks that are being processed is limited
+import gzip
+import multiprocessing
+import os
+import re
+from collections import deque
+
+
+TUPLE_RE = re.compile(r"\(((?:[^()']|'(?:[^'\\]|\\.)*')*)\)")
+FIELD_RE = re.compile(r"'((?:[^'\\]|\\.)*)'|([^,']+)")
+ESCAPE_RE = re.compile(r"\\(.)")
+ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+
+def parse_line(line):
+    """
+    Parse the values of an INSERT line
+    :param line: the line, starting with INSERT INTO
+    :return: list of tuples, every tuple is a list of strings (numbers and NULL are not converted)
+    """
+
+    values = line[line.index(" VALUES ") + 8:]
+    records = []
+    for match in TUPLE_RE.finditer(values):
+        record = []
+        for (string, other) in FIELD_RE.findall(match.group(1)):
+            if other:
+                record.append(other)
+            elif "\\" in string:
+                record.append(ESCAPE_RE.sub(lambda escape: ESCAPES.get(escape.group(1), escape.group(1)), string))
+            else:
+                record.append(string)
+        records.append(record)
+
+    return records
+
+
+class SQLDumpParser:
+
+    CHUNKSIZE = 64 << 20    # Number of bytes of a plain dump that are parsed by a process at once
+    LINES = 16              # Number of lines of a gzipped dump that are parsed by a process at once
+    QUEUESIZE = 4           # Maximum number of tasks per process that are being processed or waiting to be consumed
+
+    def __init__(self, file, function, workers=1, chunk_size=CHUNKSIZE):
+        """
+        Prepare the parsing of the dump
+        :param file: the sql file, if it ends with .gz it is read as a gzipped file
+        :param function: function that is called with the list of tuples of every INSERT line, the results are
+                         returned by the iterator. The function is passed to the processes when they start, it is
+                         pickled for every process unless the fork start method is used, so large data should be
+                         passed as the name of a file that the processes open (for instance with memory mapping)
+        :param workers: the number of processes, with 1 process the dump is parsed in this process
+        :param chunk_size: the number of bytes of a plain dump that are parsed by a process at once
+        """
+
+        self.file = file
+        self.function = function
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.gzipped = file.endswith(".gz")
+
+
+    def __iter__(self):
+        """
+        Iterate through the results of the function for every INSERT line
+        :return: generator
+        """
+
+        if self.workers <= 1:
+            with SQLDumpParser.open(self.file) as sql_file:
+                for line in sql_file:
+                    if line.startswith(b"INSERT INTO"):
+                        yield self.function(parse_line(line.decode("utf-8", errors="replace")))
+            return
+
+        with multiprocessing.Pool(self.workers, initializer=init_worker, initargs=(self.file, self.function)) as pool:
+            pending = deque()
+            for task in self.__create_tasks():
+                pending.append(pool.apply_async(parse_worker, (task,)))
+                if len(pending) >= self.workers * SQLDumpParser.QUEUESIZE:
+                    yield from pending.popleft().get()
+
+            while len(pending) > 0:
+                yield from pending.popleft().get()
+
+
+    def __create_tasks(self):
+        """
+        Create the tasks for the processes, a byte range (start, end) of a plain dump or a list of
+        INSERT lines of a gzipped dump
+        :return: generator
+        """
+
+        if not self.gzipped:
+            size = os.path.getsize(self.file)
+            for start in range(0, size, self.chunk_size):
+                yield (start, min(start + self.chunk_size, size))
+            return
+
+        with SQLDumpParser.open(self.file) as sql_file:
+            lines = []
+            for line in sql_file:
+                if line.startswith(b"INSERT INTO"):
+                    lines.append(line)
+                    if len(lines) == SQLDumpParser.LINES:
+                        yield lines
+                        lines = []
+            if len(lines) > 0:
+                yield lines
+
+
+    @staticmethod
+    def open(file):
+        """
+        Open the dump in binary mode
+        :param file:
+        :return: file object
+        """
+
+        return gzip.open(file, "rb") if file.endswith(".gz") else open(file, "rb")
+
+
+    @staticmethod
+    def read_range(file, start, end):
+        """
+        Read the lines of a plain dump that start in the byte range
+        :param file:
+        :param start: first byte of the range
+        :param end: first byte after the range
+        :return: generator with the lines
+        """
+
+        with open(file, "rb") as sql_file:
+            # Go to the first line that starts in the range
+            if start > 0:
+                sql_file.seek(start - 1)
+                sql_file.readline()
+
+            while sql_file.tell() < end:
+                line = sql_file.readline()
+                if len(line) == 0:
+                    break
+                yield line
+
+
+# The functions below are executed in the worker processes
+worker_state = {}
+
+def init_worker(file, function):
+    """
+    Remember the dump and the function in this process
+    :param file: the sql file
+    :param function: the function that is called with the tuples of every INSERT line
+    :return:
+    """
+
+    worker_state["file"] = file
+    worker_state["function"] = function
+
+
+def parse_worker(task):
+    """
+    Parse the INSERT lines of the task and call the function for every line
+    :param task: a byte range (start, end) or a list of lines
+    :return: list with the results
+    """
+
+    lines = SQLDumpParser.read_range(worker_state["file"], task[0], task[1]) if type(task) == tuple else task
+    return [worker_state["function"](parse_line(line.decode("utf-8", errors="replace"))) for line in lines if line.startswith(b"INSERT INTO")]
@@ -1,40 +1,62 @@
 # Class that creates and uses a graph of wikipedia links
 import datetime
+import hashlib
+import itertools
 import math
+import multiprocessing
 import os
 import pickle
 import re
+import shutil
+from functools import partial
+
 import networkit as nk
-import array as arr
+import numpy as np
 
 import functions
+from Graph.CSRGraph import CSRGraph
+from Graph.DistanceCache import DistanceCache
+from Graph.SQLDumpParser import SQLDumpParser
 
 
 class WikiGraph:
 
-    def __init__(self, language, sql_dir, max_degree, cache_dir):
+    MILNEWITTENCHUNKSIZE = 10000   # Number of pairs that are sent to a process at once
+    EDGECHUNKSIZE = 1000000        # Number of edges that are added to the nk.Graph at once
+    MAXDEPTH = 1000                # Distances greater than this are treated as no path
+    DISTANCECHUNKSIZE = 16         # Number of sources that are sent to a process at once
+    LOOKUPFILES = ["page_ids.npy", "page_indexes.npy", "title_hashes.npy", "title_indexes.npy"]
+
+    def __init__(self, language, sql_dir, max_degree, cache_dir, workers=1):
         """
         Set variables and read or create the graph
         :param language: "en" or "nl"
-        :param sql_dir: directory containing the files with the pages.sql and pagelinks.sql
-        :param cache_dir:
+        :param sql_dir: directory containing the files with the pages.sql and pagelinks.sql (can be gzipped)
         :param max_degree: The maximum degree a node can have, otherwise it will be ignored
         :param cache_dir: name of the directory with the cache files
+        :param workers: the number of processes that parse the sql files when the cache is created
 
         """
         self.language = language
         self.sql_dir = sql_dir
         self.cache_dir = cache_dir
         self.max_degree = max_degree
+        self.workers = workers
         self.nk_graph = None
-        self.py_graph = None
+        self.link_graph = None
+        self.distance_graph = None
         self.distance = None
         self.milne_witten = None
         self.distance_counter = 0
         self.removed = set()
-
-        (self.python_cache, self.nk_graph_cache, self.py_graph_cache, self.distance_cache, self.milne_witten_cache) = self.__cache_files()
-        if not os.path.isfile( self.python_cache) or not os.path.isfile(self.nk_graph_cache) or not os.path.isfile(self.py_graph_cache):
+        self.removed_degree = None
+
+        (self.python_cache, self.nk_graph_cache, self.py_graph_cache, self.link_graph_cache, self.distance_graph_cache, self.edges_cache, self.distance_cache, self.milne_witten_cache) = self.__cache_files()
+        if not CSRGraph.exists(self.link_graph_cache) and os.path.isfile(self.py_graph_cache):
+            self.__convert_py_graph()
+        if not CSRGraph.exists(self.distance_graph_cache) and os.path.isfile(self.nk_graph_cache):
+            self.__convert_nk_graph()
+        if not os.path.isfile( self.python_cache) or not os.path.isfile(self.nk_graph_cache) or not CSRGraph.exists(self.link_graph_cache) or not CSRGraph.exists(self.distance_graph_cache):
             self.__fill_cache(self.max_degree)
 
         self.words = self.__read_from_cache(self.python_cache)
@@ -44,214 +66,193 @@ class WikiGraph:
     def __cache_files(self):
         """
         Returns a tuple with the names of the cache files
-        :return: (python structures, graph)
+        :return: (python structures, graph, old pickled link graph, directory of the link graph, directory of the distance graph,
+                  edges, distance, milne witten)
         """
 
         return ( os.path.join(self.cache_dir, f"{self.language}_py.cache"),
                  os.path.join(self.cache_dir, f"{self.language}_nk_graph.cache"),
                  os.path.join(self.cache_dir, f"{self.language}_py_graph.cache"),
-                 os.path.join(self.cache_dir, f"{self.language}_distance.cache"),
+                 os.path.join(self.cache_dir, f"{self.language}_link_graph"),
+                 os.path.join(self.cache_dir, f"{self.language}_distance_graph"),
+                 os.path.join(self.cache_dir, f"{self.language}_edges.tmp"),
+                 os.path.join(self.cache_dir, f"{self.language}_distance.db"),
                  os.path.join(self.cache_dir, f"{self.language}_milnewitten.cache")
                  )
 
 
     def __fill_cache(self, max_degree):
         """
-        Fill the cache
+        Fill the cache, the pagelinks are read once and stored as pairs of graph ids in the edge file,
+        the degrees are determined from the edge file
         :param max_degree: The maximum degree a node can have, otherwise it will be ignored
-        :return: (words, graph) list of words and a graph
+        :return: None
         """
 
         (pages_sql, pagelinks_sql) = self.__read_sql_from_dump(self.sql_dir, self.language)
-        if os.path.isfile(self.python_cache + ".tmp"):
+        if os.path.isfile(self.python_cache + ".tmp") and os.path.isfile(self.edges_cache):
             with open(self.python_cache + ".tmp", "rb") as pickle_file:
-                (words, pageids, degrees) = pickle.load( pickle_file )
-            word_indexes = {word: index for (index, word) in enumerate(words)}
+                words = pickle.load( pickle_file )
         else:
-            (words, pageids) = self.__read_all_page_ids( pages_sql)
-            word_indexes = {word: index for (index, word) in enumerate(words)}
-            degrees = self.__read_degrees(pagelinks_sql, words, word_indexes, pageids)
-            # Write to cache
+            (words, page_ids) = self.__read_all_page_ids( pages_sql)
             with open(self.python_cache + ".tmp", "wb") as pickle_file:
-                pickle.dump((words, pageids, degrees), pickle_file)
+                pickle.dump(words, pickle_file)
+            self.__write_edges( pagelinks_sql, words, page_ids)
+            del page_ids
 
-        (nk_graph, py_graph) = self.__create_graph( pagelinks_sql, words, word_indexes, pageids, degrees, max_degree)
+        edges = np.fromfile(self.edges_cache, dtype=np.int32).reshape(-1, 2)
+        (nk_graph, link_graph, distance_graph) = self.__create_graph( edges, len(words), max_degree)
 
         print( "Saving graph...")
         nk.writeGraph(G=nk_graph, path=self.nk_graph_cache, fileformat=nk.Format.NetworkitBinary)
+        link_graph.save(self.link_graph_cache)
+        distance_graph.save(self.distance_graph_cache)
         self.__save_in_pickle(words, self.python_cache)
-        self.__save_in_pickle(py_graph, self.py_graph_cache)
-        self.__save_in_pickle({}, self.distance_cache)
+        self.remove_cache_files()       # The cached distances use the graph ids of the previous graph
         self.__save_in_pickle({}, self.milne_witten_cache)
+        os.remove(self.python_cache + ".tmp")
+        os.remove(self.edges_cache)
 
         # Free some memory
-        del word_indexes
         del words
-        del pageids
+        del edges
         del nk_graph
-        del py_graph
+        del link_graph
+        del distance_graph
 
 
-    def __save_in_pickle(self, data, file):
+    def __convert_py_graph(self):
         """
-        Saves the data in a pickle file
-        :param data:
-        :param file:
+        Convert the pickled list of destinations of an older cache into the link graph
         :return: None
         """
 
-        with open(file , "wb") as pickle_file:
-            pickle.dump(data, pickle_file)
-
-    def __replace_comma_in_string(self, str, replacement):
-        """
-        Replace the comma in a string and return the string without quotes
-        :param str:
-        :param replacement:
-        :return:
-        """
-        alt = str.replace("\\'", "##quote##")
-        parts = alt.split("'")
-        for i in range(1, len(parts), 2):
-            parts[i] = parts[i].replace(",", replacement)
-
-        return "".join(parts).replace("##quote##", "'")
-
+        print( "Converting graph...")
+        py_graph = self.__read_from_cache(self.py_graph_cache)
+        CSRGraph.from_adjacency_lists(py_graph).save(self.link_graph_cache)
+        del py_graph
+        os.remove(self.py_graph_cache)
 
 
-    def __read_values_from_sql(self, sqlfile):
+    def __convert_nk_graph(self):
         """
-        Read all values in the VALUES part of an SQL file in a list
-        :param sqlfile:
-        :return:
+        Create the distance graph from the nk.Graph of an older cache, the edges are copied into an array in chunks
+        :return: None
         """
 
-        with open(sqlfile) as file:
-            for line in file:
-                if line.startswith("INSERT INTO"):  # Only lines with inserts
-                    for part in line.replace(");\n", "").split("),("):
-                        tobesplitted = part
-                        if tobesplitted.startswith("INSERT INTO"):  # First part, start at the right part
-                            tobesplitted = tobesplitted[tobesplitted.index("(") + 1:]
-
-                        tobesplitted = self.__replace_comma_in_string(tobesplitted, "###")
-                        yield tobesplitted.split(",")
-
+        print( "Converting graph for the distances...")
+        nk_graph = self.__read_from_cache(self.nk_graph_cache)
+        edges = np.empty((nk_graph.numberOfEdges(), 2), dtype=np.int32)
+        iterator = nk_graph.iterEdges()
+        for start in range(0, len(edges), WikiGraph.EDGECHUNKSIZE):
+            stop = min(start + WikiGraph.EDGECHUNKSIZE, len(edges))
+            edges[start:stop] = np.fromiter(itertools.chain.from_iterable(itertools.islice(iterator, stop - start)), dtype=np.int32, count=2 * (stop - start)).reshape(-1, 2)
+        CSRGraph.from_edges(np.concatenate((edges[:, 0], edges[:, 1])), np.concatenate((edges[:, 1], edges[:, 0])), nk_graph.upperNodeIdBound()).save(self.distance_graph_cache)
+        del nk_graph
+        del edges
 
 
-    def __clean_word(self, word):
+    def __save_in_pickle(self, data, file):
         """
-        Clean the word by replacing special characters
-        :param word:
-        :return:
+        Saves the data in a pickle file
+        :param data:
+        :param file:
+        :return: None
         """
-        return word.replace("_", " ")
 
+        with open(file , "wb") as pickle_file:
+            pickle.dump(data, pickle_file)
 
     def __read_all_page_ids(self, pages_sql):
         """
-        Use the SQL file to read all pageid and corresponding titles,
-        read them from the cache if possible
+        Use the SQL file to read all pageid and corresponding titles
         :param pages_sql:
-        :return: list of words, and a dictionary containing the pageid as key and the word as value
+        :return: list of words, and an int64 array with the pageid of every word
         """
 
-        page_ids = {}
+        page_ids = []
         words = []
 
-        for record in self.__read_values_from_sql(pages_sql):
-            if record[1] == "0":  # Main namespace
-                pageid = int(record[0])
-                word = self.__clean_word( record[2])
+        for pages in SQLDumpParser(pages_sql, read_pages, workers=self.workers):
+            for (pageid, word) in pages:
+                page_ids.append(pageid)
                 words.append( word)
-                page_ids[pageid] = word
-
 
-        return( words, page_ids)
+        return( words, np.array(page_ids, dtype=np.int64))
 
 
-
-    def __read_degrees(self, sql_file, words, word_indexes, pageids):
+    def __write_edges(self, sql_file, words, page_ids):
         """
-        Use the SQL file to read all pagelinks and return a dictionary of dictonaries with links,
+        Use the SQL file to read all pagelinks and write the graph ids of the source and destination of every
+        link to the edge file, as pairs of 32 bit integers. The pageids and the hashes of the words are saved as
+        sorted arrays in a lookup directory that the processes open with memory mapping, so no large dictionaries
+        have to be copied to every process
         :param sql_file: sql file
         :param words: list of words
-        :param word_indexes: dictionary word -> index
-        :param pageids: dictionary pageid -> word
-        :return: a dictionary with the degrees
+        :param page_ids: int64 array with the pageid of every word
+        :return: None
         """
 
+        hashes = np.fromiter((hash_word(word) for word in words), dtype=np.uint64, count=len(words))
+        (title_hashes, title_indexes) = create_lookup(hashes)
+
+        # Different words with the same hash are marked with -2 and looked up by their title
+        collisions = {}
+        (duplicates, counts) = np.unique(hashes, return_counts=True)
+        for duplicate in duplicates[counts > 1]:
+            indexes = np.flatnonzero(hashes == duplicate)
+            if len(set([words[index] for index in indexes])) > 1:
+                title_indexes[np.searchsorted(title_hashes, duplicate)] = -2
+                for index in indexes:
+                    collisions[words[index]] = int(index)
+
+        lookup_directory = self.edges_cache + ".lookup"
+        os.makedirs(lookup_directory, exist_ok=True)
+        for (name, data) in zip(WikiGraph.LOOKUPFILES, create_lookup(page_ids) + (title_hashes, title_indexes)):
+            np.save(os.path.join(lookup_directory, name), data)
+        del hashes, title_hashes, title_indexes
+
+        function = partial(read_links, lookup_directory=lookup_directory, collisions=collisions)
+
         counter = 0
-        degrees = {}
-        for record in self.__read_values_from_sql(sql_file):
-            # Check the record
-            if len(record) > 3 and record[1] == "0" and record[3] == "0":
-                src_id = int( record[0])
-                dest_wrd = self.__clean_word( record[2])
-
-                # Check for existence
-                if src_id in pageids and dest_wrd in word_indexes:
-                    src_wrd = pageids[src_id]
-                    src_index = word_indexes[ src_wrd]
-                    dest_index = word_indexes[dest_wrd]
-                    if not src_index in degrees:
-                        degrees[src_index] = 0
-                    if not dest_index in degrees:
-                        degrees[dest_index] = 0
-
-                    degrees[src_index] += 1
-                    degrees[dest_index] += 1
-
-                if counter % 1000000 == 0:
+        with open(self.edges_cache + ".tmp", "wb") as edges_file:
+            for edges in SQLDumpParser(sql_file, function, workers=self.workers):
+                edges.tofile(edges_file)
+
+                if counter % 1000 == 0:
                     now = datetime.datetime.now()
-                    print( f"{now.hour:02}:{now.minute:02}:{now.second:02} Count {int( counter / 1000000)}")
+                    print( f"{now.hour:02}:{now.minute:02}:{now.second:02} Lines {counter}")
                 counter += 1
+        os.replace(self.edges_cache + ".tmp", self.edges_cache)
 
-        return degrees
+        worker_state.pop("lookup", None)
+        shutil.rmtree(lookup_directory)
 
 
-
-    def __create_graph(self, sql_file, words, word_indexes, pageids, degrees, max_degree):
+    def __create_graph(self, edges, nr_of_words, max_degree):
         """
-        Use the SQL file to read all pagelinks and return a dictionary of dictonaries with links
-        creates a graph as a nk.Graph and as a list of sets were the set contains all destination indexes
-        :param sql_file: sql file
-        :param words: list of words
-        :param word_indexes: dictionary word -> index
-        :param pageids: dictionary pageid -> word
-        :return:
+        Creates a graph as a nk.Graph with the links between words that do not have too many degrees,
+        the same undirected graph as a CSRGraph for the batched distances, and a CSRGraph with the
+        destinations of every word
+        :param edges: array with a row (source, destination) for every link
+        :param nr_of_words: the number of words
+        :param max_degree: The maximum degree a node can have, otherwise it will be ignored
+        :return: (nk_graph, link_graph, distance_graph)
         """
 
+        degrees = np.bincount(edges[:, 0], minlength=nr_of_words) + np.bincount(edges[:, 1], minlength=nr_of_words)
+        allowed = degrees <= max_degree
+        undirected = edges[allowed[edges[:, 0]] & allowed[edges[:, 1]]]
+        distance_graph = CSRGraph.from_edges(np.concatenate((undirected[:, 0], undirected[:, 1])), np.concatenate((undirected[:, 1], undirected[:, 0])), nr_of_words)
+        del undirected
 
-        nk_graph = nk.Graph(n=len(words),weighted=False,directed=False)
-        py_graph = []
-        py_graph = [arr.array("i", []) for i in range(0,len(word_indexes))]  # Create a list of sets with for every word, it contains the destinations
-        counter = 0
-        for record in self.__read_values_from_sql(sql_file):
-            # Check the record
-            if len(record) > 3 and record[1] == "0" and record[3] == "0":
-                src_id = int( record[0])
-                dest_wrd = self.__clean_word( record[2])
-
-                # Check for existence
-                if src_id in pageids and dest_wrd in word_indexes:
-                    src_wrd = pageids[src_id]
-                    src_index = word_indexes[ src_wrd]
-                    dest_index = word_indexes[dest_wrd]
-
-                    # Only add if there are not too many degrees
-                    if degrees[src_index] <= max_degree  and degrees[dest_index] <= max_degree:
-                        nk_graph.addEdge(src_index, dest_index, 1.0, False)
-
-                    # Add the destination to the source graph
-                    py_graph[src_index].append(dest_index)
-
-                if counter % 1000000 == 0:
-                    now = datetime.datetime.now()
-                    print( f"{now.hour:02}:{now.minute:02}:{now.second:02} Graph {int( counter / 1000000)}")
-                counter += 1
+        nk_graph = nk.Graph(n=nr_of_words,weighted=False,directed=False)
+        for start in range(0, len(edges), WikiGraph.EDGECHUNKSIZE):
+            chunk = edges[start:start + WikiGraph.EDGECHUNKSIZE]
+            for (src_index, dest_index) in chunk[allowed[chunk[:, 0]] & allowed[chunk[:, 1]]].tolist():
+                nk_graph.addEdge(src_index, dest_index, 1.0, False)
 
-        return (nk_graph, py_graph)
+        return (nk_graph, CSRGraph.from_edges(edges[:, 0], edges[:, 1], nr_of_words), distance_graph)
 
 
     def __read_from_cache(self, file):
@@ -276,21 +277,20 @@ class WikiGraph:
         Read the page.sql and the pagelink.sql from the dumpdirectory
         :param dump_dir: directory with the sql dumps
         :param language: language code
-        :return: (pages.sql, pagelinks.sql)
+        :return: (pages.sql, pagelinks.sql), the files can be gzipped
         """
 
         files = os.listdir(dump_dir)
-        dump_re = re.compile(f"{language}wiki-(\d{{8}})-page.sql")
+        dump_re = re.compile(rf"{language}wiki-(\d{{8}})-page\.sql(\.gz)?$")
         dump_files = list(filter(dump_re.match, files))
 
-        dump_files = list(filter(dump_re.match, files))
         if len(dump_files) > 0:
             pages_file = dump_files[0]
-            links_file = pages_file.replac  # To make sure we use the same date
+            links_file = pages_file.replace("-page.sql", "-pagelinks.sql")  # To make sure we use the same date
             if links_file in files:
                 return (os.path.join(dump_dir, pages_file), os.path.join(dump_dir, links_file))
 
-        print(f"Dump file does not contain the right files, use the page.sql file for this language and the accompanying pagelinks.sql file")
+        raise Exception(f"Dump file does not contain the right files, use the page.sql file for this language and the accompanying pagelinks.sql file")
 
 
     def __get_graphid_of_word(self, word):
@@ -307,55 +307,122 @@ class WikiGraph:
             return -1
 
 
+    def __get_graphids_of_words(self, words):
+        """
+        Returns the graph ids of a list of words
+        :param words:
+        :return: int64 array with the graph ids, -1 for the words that are not found
+        """
+
+        return np.fromiter((self.word_indexes.get(word.lower(), -1) for word in words), dtype=np.int64, count=len(words))
+
+
+    def __get_distance_variant(self):
+        """
+        Returns the variant of the graph for the distance cache, the distances depend on the maximum degree
+        and the removed nodes
+        :return:
+        """
+
+        return f"{self.max_degree}:{self.removed_degree}"
+
+
     def get_distance(self, word1, word2):
         """
         Determine the distance in clicks from
         :param word1:
         :param word2:
-        :return: the distance
+        :return: the distance, -1 if there is no path and -2 if a word is not in the graph
         """
 
-        if self.distance is None:
-            self.distance = self.__read_from_cache(self.distance_cache)
-            if self.distance is None:
-                self.distance = {}
-
-        # Try to read it from the cache
-        cache_key = f"{word1}#{word2}"
-        if( cache_key in self.distance):
-            return self.distance[cache_key]
-
-        if self.distance_counter is None:
-            self.distance_counter = 0
-
         src = self.__get_graphid_of_word( word1)
         target = self.__get_graphid_of_word( word2)
+        if src < 0 or target < 0 or src in self.removed or target in self.removed:
+            return -2
+
+        # Try to read it from the cache
+        if self.distance is None:
+            self.distance = DistanceCache(self.distance_cache, self.__get_distance_variant())
+        dist = self.distance.get(src, target)
+        if not dist is None:
+            return dist
 
         if self.nk_graph is None:
             self.nk_graph = self.__read_from_cache(self.nk_graph_cache)
 
-        if src >= 0 and target >= 0 and src not in self.removed and target not in self.removed:
-            biBFS = nk.distance.BidirectionalBFS(G=self.nk_graph, source=src, target=target)
-            biBFS.run()
-            print( [self.words[i] for i in biBFS.getPath()])
-            dist = int( biBFS.getDistance())
-            if dist > 1000:
-                dist = -1
-        else:
-            dist = -2
+        biBFS = nk.distance.BidirectionalBFS(G=self.nk_graph, source=src, target=target, storePred=False)
+        biBFS.run()
+        dist = int( biBFS.getDistance())
+        if dist > 1000:
+            dist = -1
 
-        # Save the data for the next time
-        self.distance[cache_key] = dist
+        # Save the data for the next time, the cache commits it with other distances
+        self.distance.put(src, target, dist)
 
-        # Save the cache every now and then
         self.distance_counter += 1
-        if self.distance_counter % 10 == 0:
-            self.save_cache_files()
-
-        print(f"{self.distance_counter}: {word1} -> {word2} [{dist}]");
+        if self.distance_counter % 1000 == 0:
+            statistics = self.distance.get_statistics()
+            print(f"{self.distance_counter} distances calculated, cache hit rate {statistics['hitrate']:.2%}")
 
         return dist
 
+    def distances_batch(self, pairs, workers=1, max_depth=MAXDEPTH):
+        """
+        Determine the distances of many pairs at once, the pairs are grouped by the source and one breadth
+        first search per source answers all its targets. The searches run in a pool of processes
+        :param pairs: list of tuples (word1, word2)
+        :param workers: the number of processes
+        :param max_depth: the maximum distance that is searched
+        :return: int64 array with the distance of every pair, -1 if there is no path within max_depth and -2
+                 if a word is not in the graph
+        """
+
+        if self.distance is None:
+            self.distance = DistanceCache(self.distance_cache, self.__get_distance_variant())
+        if self.distance_graph is None:
+            self.distance_graph = CSRGraph.load( self.distance_graph_cache)
+
+        src = self.__get_graphids_of_words([word1 for (word1, word2) in pairs])
+        target = self.__get_graphids_of_words([word2 for (word1, word2) in pairs])
+        excluded = np.zeros(len(self.distance_graph), dtype=bool)
+        excluded[list(self.removed)] = True
+
+        distances = np.full(len(pairs), -2, dtype=np.int64)
+        found = np.flatnonzero((src >= 0) & (target >= 0))
+        found = found[~excluded[src[found]] & ~excluded[target[found]]]
+
+        # Read the known distances from the cache, only the distances of the default depth are cached
+        cached = self.distance.get_many([(int(src[index]), int(target[index])) for index in found]) if max_depth == WikiGraph.MAXDEPTH else {}
+        queries = {}
+        for index in found:
+            (source, target_id) = (int(src[index]), int(target[index]))
+            key = DistanceCache.create_key(source, target_id)
+            if key in cached:
+                distances[index] = cached[key]
+            else:
+                queries.setdefault(source, {}).setdefault(target_id, []).append(index)
+
+        # One search per source
+        tasks = [(source, np.array(list(targets.keys()), dtype=np.int64)) for (source, targets) in queries.items()]
+        if workers <= 1:
+            results = [self.distance_graph.bfs_distances(source, targets, max_depth, excluded) for (source, targets) in tasks]
+        else:
+            with multiprocessing.Pool(workers, initializer=init_distance_worker, initargs=(self.distance_graph_cache, excluded, max_depth)) as pool:
+                results = pool.map(distance_worker, tasks, chunksize=WikiGraph.DISTANCECHUNKSIZE)
+
+        new_distances = []
+        for ((source, targets), result) in zip(tasks, results):
+            for (target_id, dist) in zip(targets.tolist(), result.tolist()):
+                distances[queries[source][target_id]] = dist
+                new_distances.append((source, target_id, dist))
+
+        if max_depth == WikiGraph.MAXDEPTH:
+            self.distance.put_many(new_distances)
+            self.distance.commit()
+
+        return distances
+
+
     def get_Milne_Witten(self, word1, word2):
         """
         Retrieve teh Milne&Witten score, is much faster than te distance
@@ -377,16 +444,16 @@ class WikiGraph:
         src = self.__get_graphid_of_word( word1)
         target = self.__get_graphid_of_word( word2)
 
-        if self.py_graph is None:
-            self.py_graph = self.__read_from_cache( self.py_graph_cache)
+        if self.link_graph is None:
+            self.link_graph = CSRGraph.load( self.link_graph_cache)
 
         if src >= 0  and target >= 0:
-            A = self.py_graph[src]
-            B = self.py_graph[target]
-            maximum = max( len(A), len(B))
-            minimum = min( len(A), len(B))
-            intersect = len( set(A).intersection( B))
-            wikilen = len( self.py_graph)
+            A = self.link_graph.degree(src)
+            B = self.link_graph.degree(target)
+            maximum = max( A, B)
+            minimum = min( A, B)
+            intersect = self.link_graph.count_common_neighbors(src, target)
+            wikilen = len( self.link_graph)
 
             if intersect != 0:
                 mw = 1 - (math.log(maximum) - math.log( intersect)) / (math.log(wikilen) - math.log(minimum))
@@ -402,6 +469,43 @@ class WikiGraph:
         return mw
 
 
+    def milne_witten_batch(self, pairs, workers=1):
+        """
+        Calculate the Milne&Witten score of many pairs at once, the scores are not stored in the cache
+        :param pairs: list of tuples (word1, word2)
+        :param workers: the number of processes that count the common links
+        :return: float64 array with the score of every pair, 0 if a word is not found or there are no common links
+        """
+
+        if self.link_graph is None:
+            self.link_graph = CSRGraph.load( self.link_graph_cache)
+
+        src = self.__get_graphids_of_words([word1 for (word1, word2) in pairs])
+        target = self.__get_graphids_of_words([word2 for (word1, word2) in pairs])
+        found = np.flatnonzero((src >= 0) & (target >= 0))
+        src = src[found]
+        target = target[found]
+
+        # Count the common links
+        if workers <= 1 or len(found) < WikiGraph.MILNEWITTENCHUNKSIZE:
+            intersect = self.link_graph.count_common_neighbors_batch(src, target)
+        else:
+            chunks = [(src[start:start + WikiGraph.MILNEWITTENCHUNKSIZE], target[start:start + WikiGraph.MILNEWITTENCHUNKSIZE]) for start in range(0, len(found), WikiGraph.MILNEWITTENCHUNKSIZE)]
+            with multiprocessing.Pool(workers, initializer=init_worker, initargs=(self.link_graph_cache,)) as pool:
+                intersect = np.concatenate(pool.starmap(common_neighbors_worker, chunks))
+
+        degrees = self.link_graph.get_degrees()
+        maximum = np.maximum(degrees[src], degrees[target]).astype(np.float64)
+        minimum = np.minimum(degrees[src], degrees[target]).astype(np.float64)
+        wikilen = len( self.link_graph)
+
+        mw = np.zeros(len(pairs), dtype=np.float64)
+        valid = intersect != 0
+        mw[found[valid]] = 1 - (np.log(maximum[valid]) - np.log(intersect[valid])) / (math.log(wikilen) - np.log(minimum[valid]))
+
+        return mw
+
+
     def save_cache_files(self):
         """
         Save the cache files for milne_witten and the distance
@@ -412,7 +516,7 @@ class WikiGraph:
             self.__save_in_pickle(self.milne_witten, self.milne_witten_cache)
 
         if not self.distance is None:
-            self.__save_in_pickle(self.distance, self.distance_cache)
+            self.distance.commit()
 
     def remove_cache_files(self):
         """
@@ -422,8 +526,22 @@ class WikiGraph:
 
         if os.path.isfile( self.milne_witten_cache):
             os.remove( self.milne_witten_cache)
-        if os.path.isfile( self.distance_cache):
-            os.remove( self.distance_cache)
+
+        if not self.distance is None:
+            self.distance.close()
+            self.distance = None
+        for file in [self.distance_cache, self.distance_cache + "-wal", self.distance_cache + "-shm"]:
+            if os.path.isfile( file):
+                os.remove( file)
+
+
+    def get_distance_cache_statistics(self):
+        """
+        Returns the statistics of the distance cache
+        :return: dictionary with the number of hits and misses and the hit rate, None if the cache is not used
+        """
+
+        return self.distance.get_statistics() if not self.distance is None else None
 
 
     def neighbors(self, word):
@@ -457,3 +575,143 @@ class WikiGraph:
         for node in nodes:
             self.nk_graph.removeNode( node)
             self.removed.add( node)
+
+        # The distances of the smaller graph are cached separately
+        self.removed_degree = max_degree if self.removed_degree is None else min(self.removed_degree, max_degree)
+        if not self.distance is None:
+            self.distance.commit()
+            self.distance.variant = self.__get_distance_variant()
+
+
+# The functions below are executed in the worker processes
+worker_state = {}
+
+def clean_word(word):
+    """
+    Clean the word by replacing special characters
+    :param word:
+    :return:
+    """
+    return word.replace("_", " ")
+
+
+def read_pages(records):
+    """
+    Read the pages in the main namespace from the tuples of an INSERT line of page.sql
+    :param records: list of tuples (page_id, page_namespace, page_title, ...)
+    :return: list of tuples (pageid, word)
+    """
+
+    return [(int(record[0]), clean_word(record[2])) for record in records if record[1] == "0"]
+
+
+def hash_word(word):
+    """
+    Hash the word to 64 bits, the hash is the same in every process
+    :param word:
+    :return: int
+    """
+
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8", errors="replace"), digest_size=8).digest(), "little")
+
+
+def create_lookup(keys):
+    """
+    Create a sorted lookup array of the keys, for keys that occur more than once the last index is used
+    :param keys: array with a key for every index
+    :return: tuple (sorted unique keys, int64 array with the index of every key)
+    """
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    last = np.append(sorted_keys[1:] != sorted_keys[:-1], True) if len(keys) > 0 else np.zeros(0, dtype=bool)
+    return (sorted_keys[last], order[last].astype(np.int64))
+
+
+def find_indexes(sorted_keys, indexes, keys):
+    """
+    Look up the keys in a lookup array created by create_lookup
+    :param sorted_keys: the sorted unique keys
+    :param indexes: the index of every key
+    :param keys: array with the keys to look up
+    :return: int64 array with the index of every key, -1 if the key is not found
+    """
+
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), -1, dtype=np.int64)
+
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[positions] == keys, indexes[positions], -1)
+
+
+def read_links(records, lookup_directory, collisions):
+    """
+    Read the links between pages in the main namespace from the tuples of an INSERT line of pagelinks.sql
+    :param records: list of tuples (pl_from, pl_namespace, pl_title, pl_from_namespace)
+    :param lookup_directory: directory with the lookup arrays of the pageids and of the hashes of the words,
+                             the arrays are opened with memory mapping once per process
+    :param collisions: dictionary word -> index for the words whose hash is not unique
+    :return: int32 array with a row (source, destination) for every link
+    """
+
+    if worker_state.get("lookup", (None,))[0] != lookup_directory:
+        worker_state["lookup"] = (lookup_directory,) + tuple([np.load(os.path.join(lookup_directory, name), mmap_mode="r") for name in WikiGraph.LOOKUPFILES])
+    (_, page_ids, page_indexes, title_hashes, title_indexes) = worker_state["lookup"]
+
+    links = [(int(record[0]), clean_word(record[2])) for record in records if len(record) > 3 and record[1] == "0" and record[3] == "0"]
+    if len(links) == 0:
+        return np.zeros((0, 2), dtype=np.int32)
+
+    src_indexes = find_indexes(page_ids, page_indexes, np.array([pageid for (pageid, _) in links], dtype=np.int64))
+    dest_indexes = find_indexes(title_hashes, title_indexes, np.fromiter((hash_word(word) for (_, word) in links), dtype=np.uint64, count=len(links)))
+    for position in np.flatnonzero(dest_indexes == -2):
+        dest_indexes[position] = collisions.get(links[position][1], -1)
+
+    found = (src_indexes >= 0) & (dest_indexes >= 0)
+    return np.stack([src_indexes[found], dest_indexes[found]], axis=1).astype(np.int32)
+
+
+def init_worker(link_graph_cache):
+    """
+    Open the link graph in this process
+    :param link_graph_cache: the directory of the link graph
+    :return:
+    """
+
+    worker_state["link_graph"] = CSRGraph.load(link_graph_cache)
+
+
+def init_distance_worker(distance_graph_cache, excluded, max_depth):
+    """
+    Open the distance graph in this process
+    :param distance_graph_cache: the directory of the distance graph
+    :param excluded: boolean array with the removed nodes
+    :param max_depth: the maximum distance that is searched
+    :return:
+    """
+
+    worker_state["distance_graph"] = CSRGraph.load(distance_graph_cache)
+    worker_state["excluded"] = excluded
+    worker_state["max_depth"] = max_depth
+
+
+def distance_worker(task):
+    """
+    Determine the distances from a source to its targets
+    :param task: tuple (source, array with the targets)
+    :return: array with the distance to every target
+    """
+
+    (source, targets) = task
+    return worker_state["distance_graph"].bfs_distances(source, targets, worker_state["max_depth"], worker_state["excluded"])
+
+
+def common_neighbors_worker(src, target):
+    """
+    Count the common links of the pairs
+    :param src: array with the first node of every pair
+    :param target: array with the second node of every pair
+    :return: array with the number of common links of every pair
+    """
+
+    return worker_state["link_graph"].count_common_neighbors_batch(src, target)
@@ -2,8 +2,10 @@
 
 import argparse
 import gc
-import heapq
 import html
+import multiprocessing
+import pickle
+import shutil
 
 import sys
 import os
@@ -13,8 +15,9 @@ from tqdm import tqdm
 import functions
 from Distances.DocumentRelations import DocumentRelations
 from Distances.DocumentVectors import  DocumentVectors
-from Distances.SimilarityMatrix import  SimilarityMatrix
+from Distances.SectionAligner import  SectionAligner
 from Distances.DocumentSectionRelations import  DocumentSectionRelations
+from Distances.DocumentSectionRelationsWriter import  DocumentSectionRelationsWriter
 from texts.corpus import Corpus
 
 
@@ -33,31 +36,21 @@ def read_arguments():
     parser.add_argument('-k', '--nearestneighbors', help='The maximum number of nearest neighbours to find (K)')
     parser.add_argument('-o', '--output', help='Output file for the xml file with the section relations', required=True)
     parser.add_argument('-d', '--html', help='Output directory for readable html output (debug)', required=False)
+    parser.add_argument('-w', '--workers', help='Number of processes used to align the sections (default: 1)', required=False, type=int, default=1)
     args = vars(parser.parse_args())
 
     # Create the output directory if it doesn't exist
     outputdir = os.path.dirname(args["output"])
 
     corpusdir = args["corpusdirectory"] if "corpusdirectory" in args else None
-    if corpusdir is not None and len( functions.read_all_files_from_directory(corpusdir , "xml")) == 0:
+    if corpusdir is not None and not Corpus.contains_documents(corpusdir):
         sys.stderr.write(f"Directory '{corpusdir}' doesn't contain any files\n")
         exit( 2)
 
-    return (corpusdir, args["documentvectorfile"], args["relationsfiles"], int(args["similarity"]), int(args["nearestneighbors"]), args["output"], args["html"])
+    return (corpusdir, args["documentvectorfile"], args["relationsfiles"], int(args["similarity"]), int(args["nearestneighbors"]), args["output"], args["html"], args["workers"])
 
 
 
-def section_to_dict( sections):
-    """
-    Translates the section from the document vector to a list of tuples with the name "00x" and the vector
-    that can be used for the similarity matrix
-    :param section: sections of a documentvector
-    :return: dictionary<name, vector>
-    """
-
-    return [(section_index_to_id(index),vector) for (index, vector) in sections]
-
-
 def section_index_to_id( index):
     """
     Returns the id as a string that belongs the the section with the given index
@@ -69,32 +62,73 @@ def section_index_to_id( index):
 
 
 
-def determine_NN( relations, src, dest,  min_sim, K):
+def align_pairs( aligner, pairs):
+    """
+    Align the sections of the document pairs
+    :param aligner: SectionAligner object
+    :param pairs: list of tuples (src, dest, similarity)
+    :return: generator of tuples (src, dest, similarity, sections) where sections is a list of tuples
+             (src section id, dest section id, similarity)
     """
-    Determine the Nearest Neighbours of the sections in src en dest as described in
-    "Large-scale Hierarchical Alignment for Data-driven Text Rewriting", Nikola I. Nikolov et al. section 3.2
 
-    :param relations: the sectionrelations object to add these vectors to
-    :param dest: destination vectors
-    :param src: source vectors
+    alignments = aligner.align( (src, dest) for (src, dest, sim) in pairs)
+    for ((src, dest, sim), (src_indexes, dest_indexes, similarities)) in zip(pairs, alignments):
+        sections = [(section_index_to_id(src_index), section_index_to_id(dest_index), similarity) for (src_index, dest_index, similarity) in zip(src_indexes.tolist(), dest_indexes.tolist(), similarities.tolist())]
+        yield (src, dest, sim, sections)
+
+
+def align_pairs_parallel( documentvectors, pairs, min_sim, K, workers, shard_dir):
+    """
+    Align the sections of the document pairs in a pool of processes. Every process memory maps the vector store,
+    aligns a chunk of the pairs and writes the result in a shard. The shards are read in the order of the pairs
+    :param documentvectors: the file containing the documentvectors
+    :param pairs: list of tuples (src, dest, similarity)
     :param min_sim: minimal similarity
     :param K: the number of nearest neighbours
+    :param workers: the number of processes
+    :param shard_dir: directory for the shards, it is removed afterwards
+    :return: generator with the same output as align_pairs
+    """
+
+    os.makedirs( shard_dir, exist_ok=True)
+    tasks = [(os.path.join(shard_dir, f"shard_{index:06}.pkl"), chunk) for (index, chunk) in enumerate(functions.create_chunks_of_list(pairs, SHARDSIZE))]
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(documentvectors, K, min_sim)) as pool:
+        for shard_file in pool.imap( align_worker, tasks):
+            with open(shard_file, "rb") as file:
+                records = pickle.load( file)
+            os.remove( shard_file)
+            yield from records
+
+    shutil.rmtree( shard_dir)
+
+
+# The functions below are executed in the worker processes
+SHARDSIZE = 5000    # Number of pairs in a shard
+worker_state = {}
+
+def init_worker( documentvectors, K, min_sim):
+    """
+    Open the vector store and create the aligner in this process
+    :param documentvectors: the file containing the documentvectors
+    :param K: the number of nearest neighbours
+    :param min_sim: minimal similarity
     :return:
     """
+    worker_state["aligner"] = SectionAligner( DocumentVectors.read(documentvectors), K, min_sim)
 
-    src_sections = section_to_dict(src.get_sections())
-    dst_sections = section_to_dict(dest.get_sections())
 
-    similarity = SimilarityMatrix( src_sections, dst_sections)
-    data = similarity.get_values()
-    for id in data.keys():
-        nearest = heapq.nlargest( K, data[id], key=lambda x: x[1])  # Nearest N neighbours
-        filtered = [val for val in nearest if val[1] >= min_sim] # filter on minimal similarity
-        for relation in filtered:
-            relations.add_section( id, relation[0], relation[1])
+def align_worker( task):
+    """
+    Align a chunk of the pairs and save the result as a shard
+    :param task: tuple (shard_file, pairs)
+    :return: the shard file
+    """
+
+    (shard_file, pairs) = task
+    with open(shard_file, "wb") as file:
+        pickle.dump( list(align_pairs( worker_state["aligner"], pairs)), file)
 
-    del similarity
-    #gc.collect()
+    return shard_file
 
 
 def create_htmls( dsr, corpus,  outputdir):
@@ -181,7 +215,7 @@ def create_html_text( text):
 
 # Main part of the script
 if __name__ == '__main__':
-    (corpusdir, documentvectors, documentrelations, similarity, K, output, htmldir) = read_arguments()
+    (corpusdir, documentvectors, documentrelations, similarity, K, output, htmldir, workers) = read_arguments()
 
     functions.show_message("Reading document vectors")
     dv = DocumentVectors.read(documentvectors)
@@ -193,32 +227,19 @@ if __name__ == '__main__':
     corpus = Corpus(directory=corpusdir)
     functions.show_message(f"The corpus contains {corpus.get_number_of_documents()} documents")
 
-    dsr = DocumentSectionRelations({})
-
-    nrofdocuments = dr.count()
-
-    with tqdm(total=nrofdocuments, desc="Section similarity progess") as progress:
-        cntr = 0
-        for relation in dr:
-            src = relation.get_src()
-            dest = relation.get_dest()
-            sim = relation.get_similarity()
-            src_vector = dv.get_documentvector(src)
-            dest_vector = dv.get_documentvector(dest)
-
-            relations = dsr.add(src, dest, sim)
-            NN = determine_NN( relations, src_vector, dest_vector, float(similarity) / 100.0 , K)
+    pairs = [(relation.get_src(), relation.get_dest(), relation.get_similarity()) for relation in dr]
+    if workers <= 1:
+        records = align_pairs( SectionAligner( dv, K, float(similarity) / 100.0), pairs)
+    else:
+        records = align_pairs_parallel( documentvectors, pairs, float(similarity) / 100.0, K, workers, output + ".shards")
 
-            if cntr >= nrofdocuments:
-                break
-            else:
-                cntr += 1
-                progress.update()
+    with DocumentSectionRelationsWriter( output) as writer:
+        for record in tqdm(records, total=len(pairs), desc="Section similarity progess"):
+            writer.add_pair( *record)
 
-    dsr.save(output)
     if not htmldir is None and not htmldir=="":
         print("creating html...")
-        create_htmls( dsr, corpus, htmldir)
+        create_htmls( DocumentSectionRelations.read( output), corpus, htmldir)
 
     functions.show_message("Done")
 
@@ -5,7 +5,12 @@
 import torch
 from transformers import AutoTokenizer, AutoModel
 
+import functions
+
 class BertEmbedder:
+
+    TOKENBUDGET = 8192  # Maximum number of (padded) tokens that are sent to the model at once
+
     def __init__(self, modelname, device):
         self.modelname = modelname
         self.device = device
@@ -28,16 +33,26 @@ class BertEmbedder:
         return torch.sum(token_embeddings * input_mask_expanded, 1) / torch.clamp(input_mask_expanded.sum(1), min=1e-9)
 
 
-    def embed_sentences(self, sentences, number_of_tokens):
+    def embed_sentences(self, sentences, number_of_tokens, token_budget=TOKENBUDGET):
         """
-        Embed one sentence, it is not optimal, but suffices for now
+        Embed the sentences, sentences of about the same length are put in a batch that is only padded to
+        the longest sentence in the batch. Because of the attention mask the padding does not change the embeddings
         :param sentences: the sentences to get the embeddings from, a string with words seperated by " " ending with a .
-        :param max_length: the number of tokens to be retrieved, using padding
+        :param number_of_tokens: the maximum number of tokens of a sentence, longer sentences are truncated
+        :param token_budget: the maximum number of tokens in a batch, including padding
         :return: a Pytorch tensor with the dimensions(<nrofsentences>, 768)
         """
-        encoded_input = self.tokenizer(sentences, add_special_tokens=True, max_length=number_of_tokens, padding='max_length',
-                                  return_tensors='pt', truncation=True).to( self.device)
-        with torch.no_grad():
-            outputs = self.model(**encoded_input)
-            embeddings = self.__mean_pooling(outputs, encoded_input['attention_mask'])
+        embeddings = torch.zeros((len(sentences), self.model.config.hidden_size), device=self.device)
+        if len(sentences) == 0:
             return embeddings
+
+        tokenized = self.tokenizer(sentences, add_special_tokens=True, max_length=number_of_tokens, truncation=True)
+        for batch in functions.create_length_buckets([len(input_ids) for input_ids in tokenized["input_ids"]], token_budget):
+            encoded_input = self.tokenizer.pad({"input_ids": [tokenized["input_ids"][index] for index in batch],
+                                                "attention_mask": [tokenized["attention_mask"][index] for index in batch]},
+                                               padding="longest", return_tensors="pt").to( self.device)
+            with torch.no_grad():
+                outputs = self.model(**encoded_input)
+                embeddings[batch] = self.__mean_pooling(outputs, encoded_input['attention_mask'])
+
+        return embeddings
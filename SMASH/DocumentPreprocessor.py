@@ -4,16 +4,58 @@ import os
 
 import numpy
 import torch
-from nltk.tokenize import word_tokenize
 from SMASH.CorpusDataset import CorpusDataset
 from SMASH.BertEmbedder import BertEmbedder
+from texts.textextractor import TextExtractor
+
+
+def split_document(doc):
+    """
+    Split the document into sections, lines and words, executed by the TextExtractor. The document is only
+    tokenized if it is not in the token cache of the corpus
+    :param doc: the document
+    :return:
+    [
+        [
+            ["First", "sentence", "of", "the", "first", "section"],
+            ["Second", "sentence", "of", "the", "first", "section"],
+            ...
+        ],
+        [
+            ["First", "sentence", "of", "the", "second", "section"],
+            ["Second", "sentence", "of", "the", "second", "section"],
+            ...
+        ]
+    ]
+    """
+
+    (_, tokens) = doc.get_tokens()
+
+    nonalpha = re.compile(r"\W|[0-9]")
+    sections = []
+    for section in tokens:
+        sentences = []
+        for sentence in section:
+            # Remove words with only no alpha characters
+            words =  [word for word in sentence if nonalpha.sub("", word) != ""]
+            if len(words) > 0:
+                sentences.append( words)
+
+        if len( sentences) > 0:
+            sections.append( sentences)
+
+    return sections
+
 
 class DocumentPreprocessor:
-    def __init__(self, corpus, similarities, modelname, embeddingsdir, max_sections, max_sentences, max_tokens, device, debug = False, dim=768):
+    def __init__(self, corpus, similarities, modelname, embeddingsdir, max_sections, max_sentences, max_tokens, device, debug = False, dim=768, workers=1, token_cache=True):
         """
         Fill the class properties
         :param corpus: The corpus containing the documents
         :param similarities:  The similarities from which to get the IDs
+        :param workers: the number of processes used to split the documents
+        :param token_cache: whether the sentences and words of the documents are kept between runs in the token cache
+                            of the corpus
         """
         self.corpus = corpus
         self.similarities = similarities
@@ -24,6 +66,9 @@ class DocumentPreprocessor:
         self.device = device
         self.dim = dim
         self.debug = debug
+        self.workers = workers
+        if token_cache and self.corpus.token_cache is None:
+            self.corpus.use_token_cache()
 
         self.sims = similarities.get_all_similarities()
         if self.debug:
@@ -67,48 +112,21 @@ class DocumentPreprocessor:
 
     def __read_documents(self):
         """
-        Read all documents
+        Read all documents, the documents are split in the worker processes
         :return:
         """
 
-        for docid in self.documentids:
-            doc = self.corpus.getDocument(docid)
-
-            yield docid, self.__read_document( doc)
+        ids = list( self.documentids)
+        yield from zip( ids, TextExtractor( self.corpus, split_document, workers=self.workers, ids=ids))
 
 
     def __read_document(self, doc):
         """
         Read the document, split into sections, lines and words
-        :return:
-        [
-            [
-                ["First", "sentence", "of", "the", "first", "section"],
-                ["Second", "sentence", "of", "the", "first", "section"],
-                ...
-            ],
-            [
-                ["First", "sentence", "of", "the", "second", "section"],
-                ["Second", "sentence", "of", "the", "second", "section"],
-                ...
-            ]
-        ]
+        :return: see split_document
         """
 
-        nonalpha = re.compile(r"\W|[0-9]")
-        sections = []
-        for section in doc:
-            sentences = []
-            for sentence in section.get_sentences():
-                # Remove words with only no alpha characters
-                words =  [word for word in word_tokenize( sentence) if nonalpha.sub("", word) != ""]
-                if len(words) > 0:
-                    sentences.append( words)
-
-            if len( sentences) > 0:
-                sections.append( sentences)
-
-        return sections
+        return split_document( doc)
 
 
     def __update_dict(self, the_dict, length):
@@ -179,20 +197,21 @@ class DocumentPreprocessor:
     def __bert_embeddings(self, text_data, max_sections, max_sentences, max_tokens, dim=768):
         result = torch.zeros((max_sections, max_sentences, dim))
 
+        # Create a list of the sentences of all sections, with their position in the result
+        sentences = []
+        positions = []
         for section_index in range(self.len_with_maximum(text_data, max_sections)):
             section = text_data[section_index]
-
-            # Create a list of sentences
-            sentences = []
             for sent_index in range( self.len_with_maximum(section, max_sentences)):
                 sentences.append( " ".join( section[sent_index]) + ".") # Construct a normal sentence
+                positions.append( (section_index, sent_index))
 
-            # Embed the sentences at once
-            sentence_embeddings = self.embedder.embed_sentences(sentences, max_tokens)
+        # Embed the sentences at once, the embedder batches sentences of about the same length
+        sentence_embeddings = self.embedder.embed_sentences(sentences, max_tokens)
 
-            # Put the embeddings in the result
-            for sent_index in range(len( sentence_embeddings)):
-                result[section_index][sent_index] = sentence_embeddings[sent_index]
+        # Put the embeddings in the result
+        for (index, (section_index, sent_index)) in enumerate(positions):
+            result[section_index][sent_index] = sentence_embeddings[index]
 
         return result
 
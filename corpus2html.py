@@ -28,7 +28,7 @@ def read_arguments():
     os.makedirs( outputdir, exist_ok=True)
 
     corpusdir = args["corpusdirectory"] if "corpusdirectory" in args else None
-    if corpusdir is not None and len( functions.read_all_files_from_directory(corpusdir , "xml")) == 0:
+    if corpusdir is not None and not Corpus.contains_documents(corpusdir):
         sys.stderr.write(f"Directory '{corpusdir}' doesn't contain any files\n")
         exit( 2)
 
@@ -6,6 +6,7 @@ import plotly.graph_objects as go
 import time
 
 from texts.corpus import Corpus
+from texts.textextractor import TextExtractor
 
 
 def read_arguments():
@@ -18,10 +19,11 @@ def read_arguments():
     parser.add_argument('-cd', '--corpusdir', help='Directory containing all corpora', required=True)
     parser.add_argument('-m', '--max', help='The maximum number of sections per document', required=True, type=int)
     parser.add_argument('-i', '--histogramimage', help='The filename to which the histogram will be written', required=True)
+    parser.add_argument('-w', '--workers', help='Number of processes used to read the documents (default: 1)', required=False, type=int, default=1)
 
     args = vars(parser.parse_args())
 
-    return ( args["corpusdir"], args["max"], args["histogramimage"])
+    return ( args["corpusdir"], args["max"], args["histogramimage"], args["workers"])
 
 
 def create_DOT( graph, word, max, prefix):
@@ -55,21 +57,27 @@ def read_subdirs( dir):
     return folders
 
 
-def count( corpus, max):
+def count_sections( document):
+    """
+    Counts the number of sections of the document, executed by the TextExtractor
+    :param document:
+    :return:
+    """
+    return document.get_nrof_sections()
+
+
+def count( corpus, max, workers=1):
     """
     Counts the number of sections per document in a corpus
     :param corpus: The corpus to be counted
+    :param workers: the number of processes used to read the documents
     :return: an array containing the nr of documents per count i.e.
              [0,2,5] means 0 documents have 0 sections, 2 documents with 1 section and 5 documents with 3 sections
 
     """
 
     counts = [0] * (max + 1)
-    for document in corpus:
-        nr_of_sections = 0
-        for section in document.sections:
-            nr_of_sections += 1
-
+    for nr_of_sections in TextExtractor( corpus, count_sections, workers=workers):
         # Cannot be above the max
         if nr_of_sections >= max:
             nr_of_sections = max
@@ -128,7 +136,7 @@ def create_histogram(data, max, histogram_image, title):
 
 ## Main part
 if __name__ == '__main__':
-    (corpusdir, max, histogram_image) = read_arguments()
+    (corpusdir, max, histogram_image, workers) = read_arguments()
 
     # List all corpora in the given directory
     corpusdirs = sorted(read_subdirs(corpusdir), key=str.casefold)
@@ -144,7 +152,7 @@ if __name__ == '__main__':
         corpus = Corpus(directory=corpusdirs[i])
         name = corpus.get_name()
         print(f"Counting sections in {name} ...")
-        counts[name] = count( corpus, max)
+        counts[name] = count( corpus, max, workers)
 
         if i == len( corpusdirs) - 1:
             corpora_names += " and "
@@ -14,9 +14,10 @@ def read_arguments():
     parser = argparse.ArgumentParser(description='Create a graph from the wikipedia dumps with all links as vertices')
     parser.add_argument('-l', '--language', help='Wiki language', required=True, default="en", choices=["nl", "en"])
     parser.add_argument('-d', '--maxdegree', help='The maximum number of degrees per per vertex', required=True, type=int)
+    parser.add_argument('-w', '--workers', help='The number of processes that parse the sql dumps', required=False, type=int, default=1)
     args = vars(parser.parse_args())
 
-    return ( args["language"], args["maxdegree"])
+    return ( args["language"], args["maxdegree"], args["workers"])
 
 
 def create_DOT( graph, word, max, prefix):
@@ -37,9 +38,9 @@ def create_DOT( graph, word, max, prefix):
 
 ## Main part
 if __name__ == '__main__':
-    (language, max_degree) = read_arguments()
+    (language, max_degree, workers) = read_arguments()
 
-    graph = WikiGraph(language=language, sql_dir=wikipedia_dumpdir, cache_dir="cache", max_degree=max_degree)
+    graph = WikiGraph(language=language, sql_dir=wikipedia_dumpdir, cache_dir="cache", max_degree=max_degree, workers=workers)
 
     # print( graph.get_distance( "Albert speer", "computer"))
     # print( graph.get_distance( "kyaniet", "geranium"))
@@ -6,6 +6,17 @@ import os
 
 import functions
 from texts.corpus import Corpus
+from texts.textextractor import TextExtractor
+
+
+def extract_text(document):
+    """
+    Extract the id and the text of the document in one line, executed by the TextExtractor
+    :param document:
+    :return: tuple (id, text)
+    """
+
+    return (document.get_id(), document.get_fulltext_in_one_line())
 
 
 def read_arguments():
@@ -17,6 +28,7 @@ def read_arguments():
     parser = argparse.ArgumentParser(description='Create files that can be used with the tools on https://github.com/ninikolov/lha"')
     parser.add_argument('-c', '--corpusdirectory', help='The corpus directory in the Common File Format', required=True)
     parser.add_argument('-o', '--output', help='Output directory where the files will be created with the name of corpus', required=True)
+    parser.add_argument('-w', '--workers', help='Number of processes used to read the documents (default: 1)', required=False, type=int, default=1)
     args = vars(parser.parse_args())
 
     # Create the output directory if it doesn't exist
@@ -24,12 +36,12 @@ def read_arguments():
     os.makedirs( outputdir, exist_ok=True)
 
 
-    return (args["corpusdirectory"], args["output"])
+    return (args["corpusdirectory"], args["output"], args["workers"])
 
 
 # Main part of the script
 if __name__ == '__main__':
-    (corpusdir, outputdir) = read_arguments()
+    (corpusdir, outputdir, workers) = read_arguments()
 
     functions.show_message("Reading corpus")
     corpus = Corpus(directory=corpusdir)
@@ -39,9 +51,9 @@ if __name__ == '__main__':
     ids = open( os.path.join(outputdir, corpus.get_name() + "_ids.txt"), mode="w", encoding="utf-8-sig")
     texts = open( os.path.join(outputdir, corpus.get_name() + "_texts.txt"), mode="w", encoding="utf-8-sig")
 
-    for document in corpus:
-        ids.write( document.get_id() + "\n")
-        texts.write( document.get_fulltext_in_one_line() )
+    for (id, text) in TextExtractor(corpus, extract_text, workers=workers):
+        ids.write( id + "\n")
+        texts.write( text )
 
     ids.close()
     texts.close()
@@ -5,6 +5,8 @@ import argparse
 import sys
 import os
 import functions
+from Distances.DocumentRelations import DocumentRelations
+from Distances.DocumentRelationsWriter import DocumentRelationsWriter
 from Distances.DocumentVectors import  DocumentVectors
 from Distances.DistanceIndex import  DistanceIndex
 from texts.corpus import Corpus
@@ -25,6 +27,8 @@ def read_arguments():
     parser.add_argument('-o', '--output', help='Output file for the xml file with the document relations', required=True)
     parser.add_argument('-p', '--corpus_pairs', help='Create relations from the pairs in the corpus only', required=False, type=bool, default=False)
     parser.add_argument('-r', '--html', help='Output file for readable html output', required=False)
+    parser.add_argument('-w', '--workers', help='Number of processes used to calculate the relations (default: 1)', required=False, type=int, default=1)
+    parser.add_argument('-a', '--ann_recall', help='Use the approximate nearest neighbour index, calibrated to reach this recall (between 0 and 1)', required=False, type=float)
     args = vars(parser.parse_args())
 
     # Create the output directory if it doesn't exist
@@ -32,16 +36,16 @@ def read_arguments():
     os.makedirs( outputdir, exist_ok=True)
 
     corpusdir = args["corpusdirectory"] if "corpusdirectory" in args else None
-    if corpusdir is not None and len( functions.read_all_files_from_directory(corpusdir , "xml")) == 0:
+    if corpusdir is not None and not Corpus.contains_documents(corpusdir):
         sys.stderr.write(f"Directory '{corpusdir}' doesn't contain any files\n")
         exit( 2)
 
-    return (corpusdir, args["documentvectorfile"], int(args["similarity"]), args["maxrel"], args["output"], args["html"], args["corpus_pairs"])
+    return (corpusdir, args["documentvectorfile"], int(args["similarity"]), args["maxrel"], args["output"], args["html"], args["corpus_pairs"], args["workers"], args["ann_recall"])
 
 
 # Main part of the script
 if __name__ == '__main__':
-    (corpusdir, input, similarity, maxrel, output, html, corpus_pairs) = read_arguments()
+    (corpusdir, input, similarity, maxrel, output, html, corpus_pairs, workers, ann_recall) = read_arguments()
 
     functions.show_message("Reading document vectors")
     dv = DocumentVectors.read(input)
@@ -59,17 +63,20 @@ if __name__ == '__main__':
     else:
         pairs = None
 
-    functions.show_message("Calculating distances")
-    relations = distance_index.calculate_relations_less_slow((float(similarity) / 100.0), maximum_number_of_results=maxrel, corpus_pairs=pairs)
-    functions.show_message("Saving distances")
+    functions.show_message("Calculating and saving distances")
+    with DocumentRelationsWriter( output, {"similarity" : str(similarity), "maxrel" : str(maxrel)}) as relations:
+        if ann_recall is None:
+            distance_index.calculate_relations_less_slow((float(similarity) / 100.0), maximum_number_of_results=maxrel, corpus_pairs=pairs, workers=workers, relations=relations)
+        else:
+            distance_index.calculate_relations_ann((float(similarity) / 100.0), maximum_number_of_results=maxrel, corpus_pairs=pairs, target_recall=ann_recall, workers=workers, relations=relations)
 
-
-    nr_of_relations_per_document = float( len(relations.relations)) / float(corpus.get_number_of_documents())
-    print(f"Ratio: {nr_of_relations_per_document} relations per document")
-    relations.save( output, {"similarity" : str(similarity), "maxrel" : str(maxrel), "avgrel" : str(nr_of_relations_per_document)})
+        nr_of_relations_per_document = float( relations.count()) / float(corpus.get_number_of_documents())
+        print(f"Ratio: {nr_of_relations_per_document} relations per document")
+        relations.set_parameter( "avgrel", str(nr_of_relations_per_document))
 
 
     if not html is None:
+        (relations, parameters) = DocumentRelations.read( output)
         relations.save_html( corpus, html)
 
     functions.show_message("Done")
@@ -3,8 +3,11 @@
 import argparse
 import collections
 
+from documentencoders.EmbeddingCache import EmbeddingCache
+from documentencoders.TextDeduplicator import TextDeduplicator
 from documentencoders.USEEncoder import USEEcoder
 from texts.corpus import Corpus
+from texts.textextractor import TextExtractor
 from Distances.DistanceIndex import DistanceIndex
 import sys
 import os
@@ -13,10 +16,13 @@ from documentencoders.Sent2VecEncoder import Sent2VecEncoder
 from documentencoders.AvgWord2VecEncoder import AvgWord2VecEncoder
 from documentencoders.SBertencoder import SBertEcoder
 from Distances.DocumentVectors import  DocumentVectors
+from Distances.VectorCheckpoint import VectorCheckpoint
 from tqdm import *
 import tensorflow_text
 
 
+EMBEDBATCHES = 16     # The number of batches that are collected before they are embedded
+
 # import pydevd_pycharm
 #
 # pydevd_pycharm.settrace('localhost', port=12345, stdoutToServer=True, stderrToServer=True)
@@ -31,10 +37,16 @@ def read_arguments():
     parser.add_argument('-c', '--corpusdirectory', help='The corpus directory in the Common File Format', required=True)
     parser.add_argument('-a', '--algorithm', help='The embedding algorithm (default "sent2vec")', choices=["word2vec", "sent2vec", "sbert", "use"], default="sent2vec")
     parser.add_argument('-o', '--output', help='Output file for the xml file with the documentvectors', required=True)
+    parser.add_argument('-w', '--workers', help='Number of processes used to read the documents (default: 1)', required=False, type=int, default=1)
+    parser.add_argument('-b', '--batch_size', help='Number of texts that are embedded at once (default: 64)', required=False, type=int, default=64)
+    parser.add_argument('-e', '--embedding_cache', help='SQLite file with embeddings of earlier runs, new embeddings are added', required=False, default=None)
+    parser.add_argument('-s', '--cache_size', help='Maximum size of the embedding cache in MB (default: 4096)', required=False, type=int, default=4096)
+    parser.add_argument('-n', '--checkpoint', help='Number of documents after which the vectors are written to the checkpoint file (default: 1000)', required=False, type=int, default=1000)
+    parser.add_argument('-r', '--resume', help='Resume from the checkpoint file of an earlier run, the documents in it are skipped', required=False, action='store_true')
     args = vars(parser.parse_args())
 
     corpusdir = args["corpusdirectory"] if "corpusdirectory" in args else None
-    if corpusdir is not None and len( functions.read_all_files_from_directory(corpusdir , "xml")) == 0:
+    if corpusdir is not None and not Corpus.contains_documents(corpusdir):
         sys.stderr.write(f"Directory '{corpusdir}' doesn't contain any files\n")
         exit( 2)
 
@@ -42,7 +54,7 @@ def read_arguments():
     outputdir = os.path.dirname(args["output"])
     os.makedirs( outputdir, exist_ok=True)
 
-    return (corpusdir, args["output"], args["algorithm"].lower())
+    return (corpusdir, args["output"], args["algorithm"].lower(), args["workers"], args["batch_size"], args["embedding_cache"], args["cache_size"], args["checkpoint"], args["resume"])
 
 
 def create_encoder( algorithm):
@@ -67,9 +79,35 @@ def create_encoder( algorithm):
     return encoder
 
 
+def embed_documents( encoder, documents, documentvectors, batch_size):
+    """
+    Embed the texts of the documents and their sections in batches and add the vectors
+    :param encoder: the document encoder or a TextDeduplicator
+    :param documents: list of tuples (id, text, section texts)
+    :param documentvectors: DocumentVectors object the vectors are added to
+    :param batch_size: the number of texts that are embedded at once
+    :return:
+    """
+
+    texts = []
+    for (id, text, section_texts) in documents:
+        texts.append( text)
+        texts.extend( section_texts)
+    vectors = iter( encoder.embed_batch( texts, batch_size))
+
+    for (id, text, section_texts) in documents:
+        documentvectors.add( id, next(vectors))
+
+        # Add all sections
+        for section_text in section_texts:
+            vector = next(vectors)
+            if (isinstance(vector, collections.abc.Iterable)):
+                documentvectors.add_section( id, vector)
+
+
 # Main part of the script
 if __name__ == '__main__':
-    (inputdir, output, algorithm) = read_arguments()
+    (inputdir, output, algorithm, workers, batch_size, embedding_cache, cache_size, checkpoint_interval, resume) = read_arguments()
 
     functions.show_message("Reading corpus")
     corpus = Corpus(directory=inputdir)
@@ -77,27 +115,65 @@ if __name__ == '__main__':
 
     functions.show_message("Loading encoder")
     encoder = create_encoder( algorithm)
+    if not embedding_cache is None:
+        encoder.set_cache( EmbeddingCache( embedding_cache, maximum_size=cache_size << 20))
 
-    functions.show_message("Document and sector vectors")
+    # The vectors are written to the checkpoint while they are created, only the vectors that are not in the
+    # checkpoint yet are kept in memory. When resuming, the documents in the checkpoint are skipped
     documentvectors = DocumentVectors({})
-    with tqdm(total=corpus.get_number_of_documents(), desc="Total progress") as progress:
-        for document in corpus:
-            text = document.get_fulltext_in_one_line()
-            if len( text) > 100:
-                vector = encoder.embed_text(document.get_fulltext_in_one_line())
-                documentvectors.add( document.get_id(), vector)
-
-                # Add all sections
-                for section in document:
-                    section_text = section.get_fulltext_in_one_line()
-                    vector = encoder.embed_text( section_text)
-                    if (isinstance(vector, collections.abc.Iterable)):
-                        documentvectors.add_section( document.get_id(), vector)
+    checkpoint = VectorCheckpoint( output + ".checkpoint")
+    if resume:
+        done = set( checkpoint.read_ids())
+        functions.show_message(f"Resuming, {len(done)} documents are in the checkpoint")
+    else:
+        done = set()
+        checkpoint.remove()
 
-            progress.update()
+    functions.show_message("Document and sector vectors")
+    deduplicator = TextDeduplicator( encoder)
+    ids = [id for id in corpus.get_ids() if not id in done]
+    del done
+    with tqdm(total=corpus.get_number_of_documents(), initial=corpus.get_number_of_documents() - len(ids), desc="Total progress") as progress:
+        # Collect documents until there are enough texts to fill a number of batches
+        documents = []
+        nr_of_texts = 0
+        unsaved = []
+        for (id, text, section_texts) in TextExtractor(corpus, workers=workers, ids=ids):
+            if len( text) > 100:
+                documents.append( (id, text, section_texts))
+                nr_of_texts += 1 + len(section_texts)
+
+                if nr_of_texts >= EMBEDBATCHES * batch_size:
+                    embed_documents( deduplicator, documents, documentvectors, batch_size)
+                    progress.update( len(documents))
+                    unsaved.extend( [document[0] for document in documents])
+                    documents = []
+                    nr_of_texts = 0
+
+                    if len(unsaved) >= checkpoint_interval:
+                        checkpoint.append( [documentvectors.get_documentvector( id) for id in unsaved])
+                        documentvectors = DocumentVectors({})
+                        unsaved = []
+            else:
+                progress.update()
+
+        embed_documents( deduplicator, documents, documentvectors, batch_size)
+        progress.update( len(documents))
+        unsaved.extend( [document[0] for document in documents])
+        checkpoint.append( [documentvectors.get_documentvector( id) for id in unsaved])
+        del documentvectors
+
+    statistics = deduplicator.get_statistics()
+    print(f"Deduplication: {statistics['embedded']} of {statistics['texts']} texts embedded, ratio {statistics['ratio']:.2%}")
+
+    if not encoder.cache is None:
+        statistics = encoder.cache.get_statistics()
+        print(f"Embedding cache: {statistics['hits']} hits, {statistics['misses']} misses, hit rate {statistics['hitrate']:.2%}")
+        encoder.cache.close()
 
     functions.show_message("Save vectors")
-    documentvectors.save( output)
+    DocumentVectors.write( output, checkpoint)
+    checkpoint.remove()
     del encoder
     functions.show_message("Vectors saved")
 
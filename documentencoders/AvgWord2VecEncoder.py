@@ -20,13 +20,32 @@ class AvgWord2VecEncoder(Documentencoder_base):
     def __init__(self, language_code):
         super(AvgWord2VecEncoder, self).__init__(language_code)
         modelpath = os.path.join(os.getcwd(), AvgWord2VecEncoder.WORD2VECMODELPATH_NL if language_code == "nl" else AvgWord2VecEncoder.WORD2VECMODELPATH_EN)
+        self.model_id = os.path.basename(modelpath)
         if language_code == "en":
-            self.word2vec = KeyedVectors.load_word2vec_format(modelpath, binary=True)
+            self.word2vec = AvgWord2VecEncoder.load_model(modelpath, binary=True)
         elif language_code == "nl":
-            self.word2vec = KeyedVectors.load_word2vec_format(modelpath, binary=False)
+            self.word2vec = AvgWord2VecEncoder.load_model(modelpath, binary=False)
 
         self.cleaner = Cleaner(language_code=self.language_code)
 
+
+    @staticmethod
+    def load_model(modelpath, binary):
+        """
+        Load the word2vec model. The first time the model is converted to the native gensim format, which is
+        memory mapped the next times, so it loads fast and processes share the vectors
+        :param modelpath: the model in the word2vec format
+        :param binary: True if the model is in the binary word2vec format
+        :return: KeyedVectors object
+        """
+
+        nativepath = os.path.splitext(modelpath)[0] + ".kv"
+        if not os.path.isfile(nativepath) or os.path.getmtime(nativepath) < os.path.getmtime(modelpath):
+            functions.show_message("Converting the word2vec model")
+            KeyedVectors.load_word2vec_format(modelpath, binary=binary).save(nativepath, separately=["vectors"])
+
+        return KeyedVectors.load(nativepath, mmap="r")
+
     def get_vector_size(self):
         """
         The resulting vector size
@@ -35,7 +54,7 @@ class AvgWord2VecEncoder(Documentencoder_base):
         return AvgWord2VecEncoder.WORD2VECVECTORSIZE      # This is because the Pretrained model has a fixed vector size
 
 
-    def embed_text(self, text):
+    def encode_text(self, text):
         """
         Create sentence to vec embedding
         :param text: can either be a string or a list of strings (sentences)
@@ -44,21 +63,55 @@ class AvgWord2VecEncoder(Documentencoder_base):
 
         joined = " ".join( text) if type(text) == list else text
         clean = self.cleaner.clean_text(txt=joined, remove_stop=True, remove_digits=True, lower=True)
-        vectors = self.__create_vectors(clean)
+        return self.__average_word_vectors([self.__word_indexes(clean)])[0]
 
-        return np.mean( vectors, 0).tolist()
 
+    def encode_batch(self, texts, batch_size=Documentencoder_base.BATCHSIZE):
+        """
+        Create the average word2vec embeddings of a list of texts, the word vectors of batch_size
+        texts are gathered at once
+        :param texts: list of texts, every text can either be a string or a list of strings (sentences)
+        :param batch_size: the number of texts that are embedded at once
+        :return: list of vectors
+        """
 
-    def __create_vectors(self, text):
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            joined = [" ".join( text) if type(text) == list else text for text in texts[start:start + batch_size]]
+            batch = [self.__word_indexes( clean) for clean in self.cleaner.clean_batch(joined, remove_stop=True, remove_digits=True, lower=True)]
+            vectors.extend( self.__average_word_vectors(batch))
+
+        return vectors
+
+
+    def __average_word_vectors(self, batch):
         """
-        Create a list of word vectors
-        :param text:
-        :return:
+        Average the word vectors of every text, the word vectors of all texts are gathered at once. encode_text and
+        encode_batch both use this method, so a text gets the same vector from both
+        :param batch: list with the word indexes of every text
+        :return: list of vectors, np.nan for a text without known words
         """
+
+        lengths = [len(indexes) for indexes in batch]
+        if sum(lengths) == 0:
+            return [np.nan] * len(batch)     # No known words, these are not valid vectors
+
+        word_vectors = self.word2vec.vectors[np.concatenate([np.array(indexes, dtype=np.int64) for indexes in batch])]
         vectors = []
-        for word in text:
-            if self.word2vec.has_index_for( word):
-                word_embedding = self.word2vec.get_vector(word)
-                vectors.append( word_embedding)
+        start = 0
+        for length in lengths:
+            vectors.append( word_vectors[start:start + length].mean(0).tolist() if length > 0 else np.nan)
+            start += length
 
         return vectors
+
+
+    def __word_indexes(self, text):
+        """
+        Find the indexes of the words in the word2vec model, unknown words are skipped
+        :param text: list of words
+        :return: list of indexes
+        """
+
+        key_to_index = self.word2vec.key_to_index
+        return [key_to_index[word] for word in text if word in key_to_index]
@@ -0,0 +1,130 @@
+# Class for a persistent cache of embeddings, stored in a SQLite database. The key of an embedding is
+# the hash of the encoder, the model and the text, so the same text is embedded only once, even when it
+# occurs in several corpora. When the database grows beyond the maximum size the least recently used
+# embeddings are removed
+import sqlite3
+
+import numpy as np
+
+import functions
+
+
+class EmbeddingCache:
+
+    MAXIMUMSIZE = 4 << 30   # Default maximum size of the embeddings in bytes
+    CHUNKSIZE = 500         # Maximum number of keys in one query
+
+    def __init__(self, file, maximum_size=MAXIMUMSIZE):
+        """
+        Open or create the cache
+        :param file: the SQLite database file
+        :param maximum_size: the maximum size of the embeddings in bytes
+        """
+
+        self.file = file
+        self.maximum_size = maximum_size
+        self.hits = 0
+        self.misses = 0
+
+        functions.create_directory_for_file_if_not_exists(file)
+        self.connection = sqlite3.connect(file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+
+        (self.size, self.clock) = self.connection.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0), COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()
+
+
+    @staticmethod
+    def create_key(encoder, model_id, text):
+        """
+        Create the key of an embedding
+        :param encoder: name of the encoder
+        :param model_id: the model that is used by the encoder
+        :param text: the text that is embedded
+        :return:
+        """
+
+        return functions.hash_string(f"{encoder}\t{model_id}\t{text}")
+
+
+    def get_many(self, keys):
+        """
+        Read the embeddings with the given keys
+        :param keys: list of keys
+        :return: dictionary with the key as key and the vector as value, for the keys that are in the cache
+                 a vector is a list of floats or nan if the text could not be embedded
+        """
+
+        found = {}
+        unique_keys = list(set(keys))
+        for chunk in functions.create_chunks_of_list(unique_keys, EmbeddingCache.CHUNKSIZE):
+            query = f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})"
+            for (key, vector) in self.connection.execute(query, chunk):
+                found[key] = np.frombuffer(vector, dtype=np.float32).tolist() if len(vector) > 0 else np.nan
+
+        # Mark the embeddings as recently used
+        self.clock += 1
+        for chunk in functions.create_chunks_of_list(list(found.keys()), EmbeddingCache.CHUNKSIZE):
+            self.connection.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(chunk))})", [self.clock] + chunk)
+
+        self.hits += sum([1 for key in keys if key in found])
+        self.misses += sum([1 for key in keys if not key in found])
+        return found
+
+
+    def put_many(self, items):
+        """
+        Add embeddings to the cache, and remove the least recently used embeddings if the cache is too large
+        :param items: list of tuples (key, vector), the vector is an iterable of floats, other values (nan) are
+                      stored as an empty vector
+        :return:
+        """
+
+        self.clock += 1
+        rows = []
+        for (key, vector) in dict(items).items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes() if hasattr(vector, '__iter__') else b""
+            rows.append((key, blob, self.clock))
+            self.size += len(blob)
+        self.connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+
+        if self.size > self.maximum_size:
+            self.__evict()
+        self.connection.commit()
+
+
+    def __evict(self):
+        """
+        Remove the least recently used embeddings until the cache is at 90% of its maximum size
+        :return:
+        """
+
+        to_remove = []
+        for (key, length) in self.connection.execute("SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            if self.size <= self.maximum_size * 0.9:
+                break
+            to_remove.append((key,))
+            self.size -= length
+
+        self.connection.executemany("DELETE FROM embeddings WHERE key = ?", to_remove)
+
+
+    def get_statistics(self):
+        """
+        Returns the statistics of the cache
+        :return: dictionary with the number of hits and misses, the hit rate and the size in bytes
+        """
+
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitrate": float(self.hits) / total if total > 0 else 0.0, "size": self.size}
+
+
+    def close(self):
+        """
+        Close the database
+        :return:
+        """
+
+        self.connection.commit()
+        self.connection.close()
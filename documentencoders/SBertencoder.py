@@ -20,7 +20,8 @@ class SBertEcoder(Documentencoder_base):
     def __init__(self, language_code):
         super(SBertEcoder, self).__init__(language_code)
 
-        self.model = SentenceTransformer(SBertEcoder.SBERTODELPATHS[language_code])
+        self.model_id = SBertEcoder.SBERTODELPATHS[language_code]
+        self.model = SentenceTransformer(self.model_id)
         self.cleaner = Cleaner(language_code=self.language_code)
 
     def get_vector_size(self):
@@ -31,15 +32,29 @@ class SBertEcoder(Documentencoder_base):
         return SBertEcoder.SBERTVECTORSIZE      # This is because the Pretrained model has a fixed vector size
 
 
-    def embed_text(self, text):
+    def encode_text(self, text):
         """
         Create sentence to vec embedding
         :param text: can either be a string or a list of strings (sentences)
         :return:
         """
 
-        joined = " ".join( text) if type(text) == list else text
-        clean = self.cleaner.clean_text(txt=joined, remove_stop=True, remove_digits=True, lower=False)
         vector = self.model.encode( text)
 
         return vector            # return the vector
+
+
+    def encode_batch(self, texts, batch_size=Documentencoder_base.BATCHSIZE):
+        """
+        Create sentence to vec embeddings of a list of texts. The model sorts the texts by length, so every batch
+        is padded to a length close to the length of its texts
+        :param texts: list of texts, every text can either be a string or a list of strings (sentences)
+        :param batch_size: the maximum number of texts that are embedded at once
+        :return: list of vectors
+        """
+
+        joined = [" ".join( text) if type(text) == list else text for text in texts]
+        if len(joined) == 0:
+            return []
+
+        return list(self.model.encode( joined, batch_size=batch_size))
@@ -18,6 +18,7 @@ class Sent2VecEncoder(Documentencoder_base):
         super(Sent2VecEncoder, self).__init__(language_code)
 
         modelpath = os.path.join(os.getcwd(), Sent2VecEncoder.SENT2VECMODELPATH)
+        self.model_id = os.path.basename(modelpath)
         self.sent2vec = sent2vec.Sent2vecModel()
         self.sent2vec.load_model(modelpath)
 
@@ -31,7 +32,7 @@ class Sent2VecEncoder(Documentencoder_base):
         return Sent2VecEncoder.SENT2VECVECTORSIZE      # This is because the Pretrained model has a fixed vector size
 
 
-    def embed_text(self, text):
+    def encode_text(self, text):
         """
         Create sentence to vec embedding
         :param text: can either be a string or a list of strings (sentences)
@@ -43,3 +44,21 @@ class Sent2VecEncoder(Documentencoder_base):
         vector = self.sent2vec.embed_sentence( " ".join(clean))
 
         return vector[0]            # return the first vector (there is only one)
+
+
+    def encode_batch(self, texts, batch_size=Documentencoder_base.BATCHSIZE):
+        """
+        Create sentence to vec embeddings of a list of texts, batch_size texts are embedded at once
+        :param texts: list of texts, every text can either be a string or a list of strings (sentences)
+        :param batch_size: the number of texts that are embedded at once
+        :return: list of vectors
+        """
+
+        joined = [" ".join( text) if type(text) == list else text for text in texts]
+        sentences = [" ".join( clean) for clean in self.cleaner.clean_batch(joined, remove_stop=True, remove_digits=True, lower=False)]
+
+        vectors = []
+        for start in range(0, len(sentences), batch_size):
+            vectors.extend( self.sent2vec.embed_sentences( sentences[start:start + batch_size]))
+
+        return vectors
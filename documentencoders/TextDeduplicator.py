@@ -0,0 +1,68 @@
+# Class that embeds every unique text only once. Many sections in a Wikipedia corpus have the same text
+# (for example "References" or "External links" with an empty text), the embedding of such a text is
+# remembered and used for all sections with that text
+from collections import OrderedDict
+
+import functions
+
+
+class TextDeduplicator:
+
+    MAXIMUMSIZE = 1000000   # Default number of embeddings that are remembered
+
+    def __init__(self, encoder, maximum_size=MAXIMUMSIZE):
+        """
+        Deduplicate the texts for the encoder
+        :param encoder: the document encoder that embeds the unique texts
+        :param maximum_size: the maximum number of embeddings that are remembered, the least recently used is removed first
+        """
+
+        self.encoder = encoder
+        self.maximum_size = maximum_size
+        self.embeddings = OrderedDict()     # Dictionary with the hash of the text as key and the embedding as value
+        self.nr_of_texts = 0
+        self.nr_of_embedded_texts = 0
+
+
+    def embed_batch(self, texts, batch_size):
+        """
+        Create the embeddings of a list of texts, every unique text is embedded once
+        :param texts: list of texts, every text can either be a string or a list of strings (sentences)
+        :param batch_size: the number of texts that are embedded at once by the encoder
+        :return: list with the embedding of every text, texts with the same content share the embedding
+        """
+
+        keys = [functions.hash_string(" ".join( text) if type(text) == list else text) for text in texts]
+
+        # The unique texts that were not embedded before
+        new_texts = {}
+        for (key, text) in zip(keys, texts):
+            if key in self.embeddings:
+                self.embeddings.move_to_end(key)
+            elif not key in new_texts:
+                new_texts[key] = text
+
+        if len(new_texts) > 0:
+            vectors = self.encoder.embed_batch(list(new_texts.values()), batch_size)
+            for (key, vector) in zip(new_texts.keys(), vectors):
+                self.embeddings[key] = vector
+
+        embeddings = [self.embeddings[key] for key in keys]
+
+        while len(self.embeddings) > self.maximum_size:
+            self.embeddings.popitem(last=False)
+
+        self.nr_of_texts += len(texts)
+        self.nr_of_embedded_texts += len(new_texts)
+        return embeddings
+
+
+    def get_statistics(self):
+        """
+        Returns the statistics of the deduplication
+        :return: dictionary with the number of texts, the number of embedded texts and the deduplication ratio
+                 (the part of the texts that did not have to be embedded)
+        """
+
+        ratio = 1.0 - float(self.nr_of_embedded_texts) / self.nr_of_texts if self.nr_of_texts > 0 else 0.0
+        return {"texts": self.nr_of_texts, "embedded": self.nr_of_embedded_texts, "ratio": ratio}
@@ -23,7 +23,8 @@ class USEEcoder(Documentencoder_base):
         super(USEEcoder, self).__init__(language_code)
 
         self.language_code = language_code
-        self.model =  hub.load(self.module_urls[language_code])
+        self.model_id = self.module_urls[language_code]
+        self.model =  hub.load(self.model_id)
         self.cleaner = Cleaner(language_code=self.language_code)
 
     def get_vector_size(self):
@@ -34,7 +35,7 @@ class USEEcoder(Documentencoder_base):
         return USEEcoder.USEVECTORSIZE      # This is because the Pretrained model has a fixed vector size
 
 
-    def embed_text(self, text):
+    def encode_text(self, text):
         """
         Create sentence to vec embedding
         :param text: can either be a string or a list of strings (sentences)
@@ -49,3 +50,21 @@ class USEEcoder(Documentencoder_base):
             vector = self.model( [joined])
 
         return vector.numpy().tolist()[0]            # return the vector
+
+
+    def encode_batch(self, texts, batch_size=Documentencoder_base.BATCHSIZE):
+        """
+        Create embeddings of a list of texts, the model is called with batch_size texts at once
+        :param texts: list of texts, every text can either be a string or a list of strings (sentences)
+        :param batch_size: the number of texts that are embedded at once
+        :return: list of vectors
+        """
+        # Reduce logging output.
+        logging.set_verbosity(logging.ERROR)
+        joined = [" ".join( text) if type(text) == list else text for text in texts]
+
+        vectors = []
+        for start in range(0, len(joined), batch_size):
+            vectors.extend( self.model( joined[start:start + batch_size]).numpy().tolist())
+
+        return vectors
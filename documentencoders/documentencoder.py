@@ -2,6 +2,8 @@
 
 class Documentencoder_base:
 
+    BATCHSIZE = 64  # Default number of texts that are embedded at once
+
     def __init__(self, language_code):
         """
         Initialisation of the embedder
@@ -10,6 +12,8 @@ class Documentencoder_base:
         :param language_code
         """
         self.language_code = language_code
+        self.model_id = None    # Identification of the model, part of the key in the embedding cache
+        self.cache = None       # Optional EmbeddingCache
 
 
 
@@ -22,5 +26,63 @@ class Documentencoder_base:
         raise("Not implemented")
 
 
+    def set_cache(self, cache):
+        """
+        Use an embedding cache, the cache is consulted before the model is used
+        :param cache: EmbeddingCache object or None
+        :return:
+        """
+        self.cache = cache
+
+
+    def encode_text(self, text):
+        raise("Not implemented")
+
+
+    def encode_batch(self, texts, batch_size=BATCHSIZE):
+        """
+        Create the embeddings of a list of texts with the model, encoders that can embed more texts at once
+        override this method
+        :param texts: list of texts, every text can either be a string or a list of strings (sentences)
+        :param batch_size: the number of texts that are embedded at once
+        :return: list with the embedding of every text, in the same format as encode_text
+        """
+
+        return [self.encode_text(text) for text in texts]
+
+
     def embed_text(self, text):
-        raise("Not implemented")
\ No newline at end of file
+        """
+        Create the embedding of the text, the cache is used if it is available
+        :param text: can either be a string or a list of strings (sentences)
+        :return:
+        """
+
+        if self.cache is None:
+            return self.encode_text(text)
+        else:
+            return self.embed_batch([text])[0]
+
+
+    def embed_batch(self, texts, batch_size=BATCHSIZE):
+        """
+        Create the embeddings of a list of texts, only the texts that are not in the cache are embedded by the model
+        :param texts: list of texts, every text can either be a string or a list of strings (sentences)
+        :param batch_size: the number of texts that are embedded at once
+        :return: list with the embedding of every text
+        """
+
+        if self.cache is None:
+            return self.encode_batch(texts, batch_size)
+
+        # The key contains the text before cleaning, the cleaning only depends on the encoder
+        keys = [self.cache.create_key(type(self).__name__, self.model_id, " ".join( text) if type(text) == list else text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing = [index for (index, key) in enumerate(keys) if not key in found]
+        if len(missing) > 0:
+            vectors = self.encode_batch([texts[index] for index in missing], batch_size)
+            self.cache.put_many([(keys[index], vector) for (index, vector) in zip(missing, vectors)])
+            found.update({keys[index]: vector for (index, vector) in zip(missing, vectors)})
+
+        return [found[key] for key in keys]
@@ -17,6 +17,23 @@ def hash_string(to_be_hashed):
     return hash_object.hexdigest()
 
 
+def hash_files(filenames, block_size=1 << 20):
+    """
+    Creates a hash string of the contents of the files, only for uniqueness
+    :param filenames: list of files
+    :param block_size: number of bytes read at once
+    :return:
+    """
+
+    hash_object = hashlib.sha1()
+    for filename in filenames:
+        with open(filename, "rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                hash_object.update(block)
+
+    return hash_object.hexdigest()
+
+
 def create_directory_if_not_exists(dir_name):
     """
     Creates a directory if it doesn't exist
@@ -112,6 +129,32 @@ def create_chunks_of_list(theList, chunk_size):
     return [theList[i:i + chunk_size] for i in range(0, len(theList), chunk_size)]
 
 
+def create_length_buckets(lengths, token_budget, max_batch_size=None):
+    """
+    Groups items of about the same length in batches, so little padding is needed. The items are sorted
+    on length and a batch is full when the padded size (number of items times the longest item) would
+    exceed the token budget
+    :param lengths: list with the length (number of tokens) of every item
+    :param token_budget: maximum number of tokens in a padded batch, a longer item gets its own batch
+    :param max_batch_size: optional maximum number of items in a batch
+    :return: list of batches, every batch is a list with the indexes of the items
+    """
+
+    batches = []
+    batch = []
+    for index in sorted(range(len(lengths)), key=lambda index: lengths[index]):
+        longest = max(lengths[index], 1)     # The items are sorted, so this is the longest item of the batch
+        if len(batch) > 0 and ((len(batch) + 1) * longest > token_budget or (not max_batch_size is None and len(batch) >= max_batch_size)):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+
+    if len(batch) > 0:
+        batches.append(batch)
+
+    return batches
+
+
 def translate_language_code(language_code):
     """
     Translate the language code to a language for nltk-data
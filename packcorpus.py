@@ -0,0 +1,42 @@
+# Script to pack a corpus in the Common File Format into one file, so the tools don't have to read
+# every Xml file of the corpus. Run the script again after the corpus has changed, or with --check to see
+# whether the Xml files changed after the corpus was packed
+import argparse
+
+import functions
+from texts.corpus import Corpus
+from texts.packedcorpus import PackedCorpus
+
+
+def read_arguments():
+    """
+    Read the arguments from the commandline
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description='Pack a corpus in the Common File Format into one file that is used by the other tools.')
+    parser.add_argument('-c', '--corpusdirectory', help='The corpus directory in the Common File Format', required=True)
+    parser.add_argument('-k', '--check', help='Only check whether the packed corpus is up to date with the Xml files', action='store_true')
+    args = vars(parser.parse_args())
+
+    return (args["corpusdirectory"], args["check"])
+
+
+# Main part of the script
+if __name__ == '__main__':
+    (corpusdir, check) = read_arguments()
+
+    if check:
+        if not PackedCorpus.exists(corpusdir):
+            functions.show_message("The corpus is not packed")
+            exit( 1)
+        if PackedCorpus.is_stale(corpusdir):
+            functions.show_message("The Xml files changed after the corpus was packed, run packcorpus.py to update the packed corpus")
+            exit( 1)
+        functions.show_message("The packed corpus is up to date")
+        exit( 0)
+
+    functions.show_message("Packing corpus")
+    corpus = Corpus(directory=corpusdir, cache_size=0, use_packed=False)
+    nr_of_documents = corpus.pack()
+    functions.show_message(f"{nr_of_documents} documents packed")
@@ -0,0 +1,96 @@
+# Microbenchmark of the Cleaner, the throughput of the Cleaner is compared with the implementation
+# it replaced (a list of stopwords and character by character filtering).
+# Run it from the root of the repository, so the texts package is found, with a corpus in the Common
+# File Format and the NLTK stopwords installed (python -m nltk.downloader stopwords):
+#   python -m tests.cleanerbenchmark -c <corpus directory> [-n <number of texts>]
+import argparse
+import string
+import time
+
+from texts.clean import Cleaner
+from texts.corpus import Corpus
+
+
+def read_arguments():
+    """
+    Read the arguments from the commandline
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description='Measure the throughput of the Cleaner in MB/s.')
+    parser.add_argument('-c', '--corpusdirectory', help='The corpus directory in the Common File Format, the texts are taken from this corpus', required=True)
+    parser.add_argument('-n', '--number', help='Number of section texts that are measured (default: 1000)', required=False, type=int, default=1000)
+    args = vars(parser.parse_args())
+
+    return (args["corpusdirectory"], args["number"])
+
+
+def previous_clean_text(cleaner, stop, txt, lower=False, remove_digits=True, remove_stop=True):
+    """
+    The clean_text of the previous version, with the stopwords in a list
+    """
+    clean = txt.lower() if lower else txt
+    words = cleaner.toktok(clean)
+
+    clean_words = []
+    for word in words:
+        if not (word in stop and remove_stop) and not (remove_digits and word.isdigit()):
+            clean_words.append( word)
+
+    return clean_words
+
+
+PRINTABLE = set(string.printable)
+
+def previous_printable_text(txt):
+    """
+    The printable_text of the previous version, that filters character by character
+    """
+    printable = PRINTABLE
+    clean = txt.replace('\n', ' ').replace('\r', ' ').replace("\t", " ")
+    clean = " ".join(clean.strip(' \t\n\r').split())
+    clean = "".join([char for char in clean if char in printable])
+
+    return " ".join(clean.split())
+
+
+def measure(name, function, texts):
+    """
+    Call the function for every text and print the throughput
+    :param name: the name that is printed
+    :param function: the function that is called with a text
+    :param texts: list of texts
+    :return: the throughput in MB/s
+    """
+
+    size = sum([len(text.encode("utf-8")) for text in texts]) / float(1 << 20)
+    start = time.perf_counter()
+    for text in texts:
+        function(text)
+    seconds = time.perf_counter() - start
+
+    print(f"{name:<30} {size / seconds:8.2f} MB/s")
+    return size / seconds
+
+
+# Main part of the script
+if __name__ == '__main__':
+    (corpusdir, number) = read_arguments()
+
+    corpus = Corpus(directory=corpusdir, cache_size=0)
+    texts = []
+    for document in corpus.stream():
+        texts.extend([section.get_fulltext() for section in document])
+        if len(texts) >= number:
+            break
+
+    cleaner = Cleaner(language_code=corpus.get_language_code())
+    stop = list(cleaner.stop)
+
+    before = measure("clean_text (before)", lambda text: previous_clean_text(cleaner, stop, text, lower=True), texts)
+    after = measure("clean_text", lambda text: cleaner.clean_text(text, lower=True), texts)
+    print(f"Speedup clean_text: {after / before:.1f}x")
+
+    before = measure("printable_text (before)", previous_printable_text, texts)
+    after = measure("printable_text", cleaner.printable_text, texts)
+    print(f"Speedup printable_text: {after / before:.1f}x")
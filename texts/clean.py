@@ -20,6 +20,9 @@ class Cleaner():
         WHITESPACE_REGEX: r" "  # replace all spaces and tabs with a single space
     }
 
+    # Translation table that deletes the ascii characters that are not printable, other characters are removed by encoding as ascii
+    NOT_PRINTABLE = str.maketrans("", "", "".join([chr(code) for code in range(128) if not chr(code) in string.printable]))
+
     def __init__(self, language_code):
         """
         Init the cleaner for the given language code (now nl or en)
@@ -29,7 +32,7 @@ class Cleaner():
         self.language_code = language_code.lower()
         self.language = functions.translate_language_code( language_code)
 
-        self.stop = stopwords.words(self.language) + list(string.punctuation)
+        self.stop = frozenset(stopwords.words(self.language) + list(string.punctuation))
         self.tokenizer = RegexpTokenizer(r'\w+')
         self.stemmer = SnowballStemmer(self.language)
         self.printable = set(string.printable)
@@ -97,12 +100,36 @@ class Cleaner():
         words = self.toktok(clean)
 
         # Remove stopwords and digits
-        clean_words = []
-        for word in words:
-            if not (word in self.stop and remove_stop) and not (remove_digits and word.isdigit()):
-                clean_words.append( word)
+        stop = self.stop if remove_stop else frozenset()
+        if remove_digits:
+            return [word for word in words if not word in stop and not word.isdigit()]
+        else:
+            return [word for word in words if not word in stop]
 
-        return clean_words # Create a text again
+
+    def clean_batch(self, texts, lower=False, remove_digits=True, remove_stop=True):
+        """
+        Clean a list of texts according to the parameters, gives the same result as clean_text for every text
+        but looks up the tokenizer and the stopwords once for the whole batch
+        :param texts: list of texts
+        :param lower:
+        :param remove_digits:
+        :param remove_stop:
+        :return: list with a cleaned list of words for every text
+        """
+
+        toktok = self.toktok
+        stop = self.stop if remove_stop else frozenset()
+
+        cleaned = []
+        for txt in texts:
+            words = toktok(txt.lower() if lower else txt)
+            if remove_digits:
+                cleaned.append([word for word in words if not word in stop and not word.isdigit()])
+            else:
+                cleaned.append([word for word in words if not word in stop])
+
+        return cleaned
 
 
 
@@ -112,7 +139,7 @@ class Cleaner():
         :return: cleaned string
         """
         clean = self.light_clean(txt)
-        clean = "".join([char for char in clean if char in self.printable])
+        clean = clean.encode("ascii", "ignore").decode("ascii").translate(Cleaner.NOT_PRINTABLE)
 
         return " ".join(clean.split())
 
@@ -125,9 +152,7 @@ class Cleaner():
         :return:
         """
         # return multi_regex_clean(txt, {WHITESPACE_REGEX: r" "})
-        clean = txt.replace('\n', ' ').replace('\r', ' ').replace("\t", " ")
-        clean = clean.strip(' \t\n\r')
-        return " ".join(clean.split())
+        return " ".join(txt.split())
 
 
 
@@ -137,8 +162,9 @@ class Cleaner():
         :return:
         """
         out = []
+        stop = self.stop
         for w in self.tokenizer.tokenize(txt):
-            if w not in self.stop and w != '':
+            if w not in stop and w != '':
                 try:
                     w_stem = self.stemmer.stem(w)
                     out.append(w_stem)
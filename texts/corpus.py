@@ -1,21 +1,34 @@
 # Class to read a corpus in the Common Format and iterates through documents
 import os.path
 import random
+from collections import OrderedDict
 
 import sklearn.model_selection
 
 import functions
 from Distances.DocumentRelations import DocumentRelations
 from texts.document import Document
+from texts.packedcorpus import PackedCorpus
 from texts.similarities import Similarities
 from pathlib import Path
 
 class Corpus:
 
-    def __init__(self, directory):
+    CACHESIZE = 10000           # Default number of parsed documents that are kept in memory
+    TOKENCACHE = "tokens.db"    # The TokenCache in the corpus directory
+
+    def __init__(self, directory, cache_size=CACHESIZE, use_packed=None, files=None, token_cache=None):
         """
         Read the corpus
         :param directory:
+        :param cache_size: maximum number of parsed documents in the cache, the least recently used document
+                           is removed first. None for an unbounded cache, 0 to disable the cache
+        :param use_packed: whether the packed corpus is used, None to use it if it exists. Whether the packed
+                           corpus is up to date is not checked here, see packcorpus.py --check
+        :param files: dictionary with the id as key and the Xml file as value, used instead of walking the
+                      directory when the packed corpus is not used
+        :param token_cache: file of the TokenCache that keeps the sentences and words of the documents, None to
+                            split the texts with NLTK every time, see use_token_cache
         """
 
         self.directory = directory
@@ -23,12 +36,50 @@ class Corpus:
         self.name = name
         self.language_code = language_code
 
-        # Create a directory of filenames (without extensions) and their corresponding path
-        self.files = {Path(file).stem:file for file in functions.read_all_files_from_directory( self.directory, "xml")}
-        self.ids = list(self.files.keys())
+        # Use the packed corpus if it exists, otherwise create a directory of filenames (without extensions)
+        # and their corresponding path
+        if use_packed is None:
+            use_packed = PackedCorpus.exists( directory)
+
+        if use_packed:
+            self.packed = PackedCorpus( directory)
+            self.files = None
+            self.ids = self.packed.ids
+        else:
+            self.packed = None
+            self.files = files if not files is None else {Path(file).stem:file for file in functions.read_all_files_from_directory( self.directory, "xml")}
+            self.ids = list(self.files.keys())
+        self.id_to_index = {id: index for (index, id) in enumerate(self.ids)}
 
         self.language = functions.translate_language_code(language_code)
-        self.documentCache = {}
+        self.token_cache = token_cache
+        self.documentCache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def contains_documents(directory):
+        """
+        Checks whether the directory contains a corpus with documents, a packed corpus or Xml files.
+        The directory is only walked when there is no packed corpus
+        :param directory: the corpus directory
+        :return:
+        """
+
+        return PackedCorpus.exists( directory) or len( functions.read_all_files_from_directory( directory, "xml")) > 0
+
+
+    def use_token_cache(self, file=None):
+        """
+        Keep the sentences and words of the documents that are read from now on in a TokenCache
+        :param file: the SQLite file of the cache, None for the cache in the corpus directory
+        :return:
+        """
+
+        self.token_cache = file if not file is None else os.path.join(self.directory, Corpus.TOKENCACHE)
+        self.documentCache.clear()
+
 
     def get_ids(self):
         """
@@ -88,7 +139,7 @@ class Corpus:
         :return:
         """
 
-        return self.ids.index( id)
+        return self.id_to_index[id]
 
 
     def __iter__(self):
@@ -118,29 +169,83 @@ class Corpus:
 
     def getDocument(self, id):
         """
-        Read the document by id
+        Read the document by id, the document is kept in the cache
         :param id: 
         :return: 
         """""
 
         if id in self.documentCache:
+            self.cache_hits += 1
+            self.documentCache.move_to_end(id)
             return self.documentCache[id]
         else:
-            if not id in self.files:
-                raise Exception( f"Unknown id {id}")
+            self.cache_misses += 1
+            document = self.read_document(id)
+            if self.cache_size is None or self.cache_size > 0:
+                self.documentCache[id] = document
+                if not self.cache_size is None and len(self.documentCache) > self.cache_size:
+                    self.documentCache.popitem(last=False)   # Remove the least recently used document
 
-            document =  Document(filename=self.files[id], language=self.language, index=self.get_index_of_id( id))
-            self.documentCache[id] = document
             return document
 
 
+    def read_document(self, id):
+        """
+        Read the document by id, without using the cache
+        :param id:
+        :return:
+        """
+
+        if not id in self.id_to_index:
+            raise Exception( f"Unknown id {id}")
+
+        index = self.get_index_of_id( id)
+        if self.packed is None:
+            return Document(filename=self.files[id], language=self.language, index=index, token_cache=self.token_cache)
+        else:
+            return Document(filename=os.path.join(self.directory, PackedCorpus.DATA), language=self.language, index=index, record=self.packed.read_record( index), token_cache=self.token_cache)
+
+
+    def stream(self):
+        """
+        Iterate through the documents without adding them to the cache, for tools that read every document once
+        :return: generator of documents
+        """
+
+        for id in self.ids:
+            if id in self.documentCache:
+                yield self.documentCache[id]
+            else:
+                yield self.read_document(id)
+
+
+    def get_cache_statistics(self):
+        """
+        Returns the statistics of the document cache
+        :return: dictionary with the number of hits, misses and documents in the cache
+        """
+
+        return {"hits": self.cache_hits, "misses": self.cache_misses, "size": len(self.documentCache)}
+
+
     def has_document(self, id):
         """
         Checks whether the document with the given Id is in the corpus
         :param id:
         :return:
         """
-        return id in self.files
+        return id in self.id_to_index
+
+
+    def pack(self):
+        """
+        Write a packed version of the corpus from the Xml files in the corpus directory, the next time
+        the corpus is opened all documents are read from the packed file
+        :return: the number of documents that are packed
+        """
+
+        files = {Path(file).stem:file for file in functions.read_all_files_from_directory( self.directory, "xml")}
+        return PackedCorpus.write( self.directory, files)
 
 
     def read_similarities(self, single=False):
@@ -2,6 +2,7 @@
 import functions
 from lxml import etree as ET
 from texts.section import Section
+from texts.tokencache import TokenCache, tokenize_document
 from html import escape
 import urllib.parse
 import html
@@ -10,19 +11,46 @@ import re
 
 class Document:
 
-    def __init__(self, filename, language, index):
+    def __init__(self, filename, language, index, record=None, token_cache=None):
         """
         Read the documents from the file
         :param filename:
         :param language: full name of the language
         :param index: numeric index (starting at 0)
+        :param record: the information of the document as created by read_record, if given the file is not read
+        :param token_cache: file of the TokenCache with the sentences and words of the documents, None to split
+                            the texts with NLTK every time
         """
         self.filename = filename
-        self.xml = ET.parse(filename)
-        self.element = self.xml.getroot()
-        self.sections = self.element.findall("section")
+        (self.id, self.title, self.sections, self.links) = record if not record is None else Document.read_record( filename)
         self.language = language
         self.index = index
+        self.token_cache = token_cache
+        self.tokens = None
+
+
+    @staticmethod
+    def read_record(filename):
+        """
+        Read all information of the document from the file
+        :param filename:
+        :return: tuple (id, title, sections, links) with sections a list of tuples (id, title, text) and
+                 links a list of tuples (id, similarity)
+        """
+
+        element = ET.parse(filename).getroot()
+        title = element.find("title").text
+        sections = [Section.read_record( section) for section in element.findall("section")]
+
+        links = []
+        links_element = element.find("links")
+        if not links_element is None:
+            for link in links_element.findall("link"):
+                similarity = int(link.attrib["class"]) if "class" in link.attrib else 2
+                links.append( (link.attrib["id"], similarity))
+
+        return (element.attrib["id"], title if not title is None else "", sections, links)
+
 
     def get_id(self):
         """
@@ -30,7 +58,7 @@ class Document:
         :return:
         """
 
-        return self.element.attrib["id"]
+        return self.id
 
     def get_index(self):
         """
@@ -41,8 +69,7 @@ class Document:
 
 
     def get_title(self):
-        title = self.element.find("title").text
-        return title if not title is None else ""
+        return self.title
 
 
     def get_fulltext(self, nr_of_sections = None):
@@ -94,14 +121,36 @@ class Document:
         """
 
         if self.section_index < len( self.sections):
-            section_elem = self.sections[self.section_index]
+            section_record = self.sections[self.section_index]
+            sentences = self.get_tokens()[0][self.section_index] if not self.token_cache is None else None
             self.section_index += 1  # Ready for the next section
-            return Section( element=section_elem, language=self.language)
+            return Section( element=None, language=self.language, record=section_record, sentences=sentences)
 
         else:  # Done
             raise StopIteration
 
 
+    def split_sentences(self):
+        """
+        Split the texts of the sections in sentences with NLTK, without using the token cache
+        :return: list with a list of sentences for every section
+        """
+
+        return [Section( element=None, language=self.language, record=section_record).split_sentences() for section_record in self.sections]
+
+
+    def get_tokens(self):
+        """
+        Returns the sentences and words of the sections, from the token cache if the document uses one
+        :return: tuple (sentences, words), see tokenize_document
+        """
+
+        if self.tokens is None:
+            self.tokens = tokenize_document( self) if self.token_cache is None else TokenCache.open( self.token_cache).get_tokens( self)
+
+        return self.tokens
+
+
     def get_nrof_sections(self):
         """
         Returns the number of sections in this document
@@ -112,21 +161,23 @@ class Document:
 
 
 
+    def get_content_hash(self):
+        """
+        Returns a hash of the texts and the language of the document
+        :return:
+        """
+
+        texts = [self.language, self.title] + [f"{title}\t{text}" for (id, title, text) in self.sections]
+        return functions.hash_string("\n".join(texts))
+
+
     def get_links(self):
         """
         Returns a list of tuples with the links
         :return: [(id, similarity)] a list of tuples with the documentid of the destination and the similarity (0,1 or 2)
         """
 
-        info = []
-        links = self.element.find("links")
-        if not links is None:
-            for link in links.findall("link"):
-                dest = link.attrib["id"]
-                similarity =  int(link.attrib["class"]) if "class" in link.attrib else 2
-                info.append( (dest, similarity))
-
-        return info
+        return list(self.links)
 
     def create_html_link(self, target="_self", language_code=None):
         """
@@ -0,0 +1,162 @@
+# Class to read and write a packed corpus, all documents of a corpus in the Common File Format are stored
+# in one file, so the corpus can be opened without walking the directory and parsing every Xml file.
+# The packed corpus consists of two files in the corpus directory
+#   corpus.pack        the records of the documents, every record is a 4 byte length followed by the
+#                      pickled tuple created by Document.read_record
+#   corpus.pack.info   the number of Xml files and the modification time of the newest one when the corpus
+#                      was packed, used by packcorpus.py --check to detect that the Xml files changed
+#   corpus.pack.index  the id and the offset of the record of every document, one per line separated by a tab,
+#                      written last, it marks the packed corpus as complete
+import json
+import mmap
+import os
+import pickle
+import struct
+
+from tqdm import tqdm
+
+from texts.document import Document
+
+
+class PackedCorpus:
+
+    DATA = "corpus.pack"
+    INDEX = "corpus.pack.index"
+    INFO = "corpus.pack.info"
+    LENGTH = struct.Struct("<I")   # The length that precedes every record
+
+    def __init__(self, directory):
+        """
+        Open the packed corpus with memory mapping, only the index is read into memory
+        :param directory: the corpus directory
+        """
+
+        self.directory = directory
+        self.ids = []
+        self.offsets = []
+        with open(os.path.join(directory, PackedCorpus.INDEX), mode="r", encoding="utf-8") as index_file:
+            for line in index_file:
+                (id, offset) = line.rstrip("\n").split("\t")
+                self.ids.append(id)
+                self.offsets.append(int(offset))
+
+        self.file = open(os.path.join(directory, PackedCorpus.DATA), "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if len(self.ids) > 0 else b""
+
+
+    @staticmethod
+    def exists(directory):
+        """
+        Checks whether the corpus directory contains a complete packed corpus
+        :param directory:
+        :return:
+        """
+
+        return os.path.isfile(os.path.join(directory, PackedCorpus.INDEX)) and os.path.isfile(os.path.join(directory, PackedCorpus.DATA))
+
+
+    @staticmethod
+    def scan(directory):
+        """
+        Count the Xml files in the corpus directory (recursively) and determine the newest modification time,
+        only the directory entries are read, not the files
+        :param directory:
+        :return: tuple (number of Xml files, modification time of the newest Xml file)
+        """
+
+        count = 0
+        newest = 0.0
+        directories = [directory]
+        while len(directories) > 0:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.name.endswith(".xml"):
+                        count += 1
+                        newest = max(newest, entry.stat().st_mtime)
+
+        return (count, newest)
+
+
+    @staticmethod
+    def is_stale(directory):
+        """
+        Checks whether the Xml files of the corpus changed after the corpus was packed, Xml files are added,
+        removed or modified. A directory without Xml files is never stale, the packed corpus is the only copy
+        :param directory: the corpus directory
+        :return:
+        """
+
+        (count, newest) = PackedCorpus.scan(directory)
+        if count == 0:
+            return False
+
+        info_file = os.path.join(directory, PackedCorpus.INFO)
+        if not os.path.isfile(info_file):
+            return True     # Packed by an older version
+        with open(info_file, mode="r", encoding="utf-8") as info_input:
+            info = json.load(info_input)
+
+        return count != info["files"] or newest > info["newest"]
+
+
+    @staticmethod
+    def write(directory, files):
+        """
+        Pack the documents of the corpus, the packed corpus replaces the previous one
+        :param directory: the corpus directory
+        :param files: dictionary with the id as key and the Xml file of the document as value
+        :return: the number of documents
+        """
+
+        data_file = os.path.join(directory, PackedCorpus.DATA)
+        index_file = os.path.join(directory, PackedCorpus.INDEX)
+        info_file = os.path.join(directory, PackedCorpus.INFO)
+        if os.path.isfile(index_file):
+            os.remove(index_file)
+
+        # Determined before the files are read, so a file that changes while packing makes the pack stale
+        (count, newest) = PackedCorpus.scan(directory)
+
+        index = []
+        with open(data_file + ".tmp", "wb") as data:
+            for (id, file) in tqdm(files.items(), desc="Packing documents"):
+                record = pickle.dumps(Document.read_record(file), protocol=pickle.HIGHEST_PROTOCOL)
+                index.append(f"{id}\t{data.tell()}\n")
+                data.write(PackedCorpus.LENGTH.pack(len(record)))
+                data.write(record)
+        os.replace(data_file + ".tmp", data_file)
+
+        with open(info_file, mode="w", encoding="utf-8") as info_output:
+            json.dump({"files": count, "newest": newest}, info_output)
+
+        with open(index_file + ".tmp", mode="w", encoding="utf-8") as index_output:
+            index_output.writelines(index)
+        os.replace(index_file + ".tmp", index_file)
+
+        return len(index)
+
+
+    def read_record(self, index):
+        """
+        Read the record of the document at the given index
+        :param index:
+        :return: tuple (id, title, sections, links), see Document.read_record
+        """
+
+        offset = self.offsets[index]
+        (length,) = PackedCorpus.LENGTH.unpack_from(self.data, offset)
+        start = offset + PackedCorpus.LENGTH.size
+        return pickle.loads(self.data[start:start + length])
+
+
+    def close(self):
+        """
+        Close the data file
+        :return:
+        """
+
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
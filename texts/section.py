@@ -2,21 +2,38 @@
 import re
 
 import functions
-from lxml import etree as ET
 from nltk.tokenize import sent_tokenize
 
 
 class Section:
 
-    def __init__(self, element, language):
+    def __init__(self, element, language, record=None, sentences=None):
         """
         Gets information about the section
-        :param element: xml element containing the section
+        :param element: xml element containing the section, not used if a record is given
         :param language: full name of the language
+        :param record: tuple (id, title, text) as created by read_record, for example from a packed corpus
+        :param sentences: the sentences of the section if they are known, for example from a TokenCache
         """
-        self.element = element
+        self.record = record if not record is None else Section.read_record( element)
         self.language = language
+        self.sentences = sentences
+
+
+    @staticmethod
+    def read_record(element):
+        """
+        Read the information from the xml element of the section
+        :param element: xml element containing the section
+        :return: tuple (id, title, text)
+        """
+
+        if element.find("title") is None or element.find("text") is None:
+            print( functions.xml_as_string( element))
 
+        title = element.find("title")
+        text = element.find("text")
+        return (element.attrib["id"], title.text if not title is None and not title.text is None else "", text.text if not text is None and not text.text is None else "")
 
 
     def get_id(self):
@@ -25,21 +42,13 @@ class Section:
         :return:
         """
 
-        return self.element.attrib["id"]
+        return self.record[0]
 
     def get_title(self):
-        if self.element.find("title") is None:
-            print( functions.xml_as_string( self.element))
-
-        title = self.element.find("title").text
-        return title if not title is None else ""
+        return self.record[1]
 
     def get_text(self):
-        if self.element.find("text") is None:
-            print( functions.xml_as_string( self.element))
-
-        text = self.element.find("text").text
-        return text if not text is None else ""
+        return self.record[2]
 
 
     def get_fulltext_in_one_line(self):
@@ -65,9 +74,18 @@ class Section:
 
     def get_sentences(self):
         """
-        Returns a list of sentences
+        Returns a list of sentences, the sentences of the token cache if the document uses one
         :return:
         """
 
+        return self.sentences if not self.sentences is None else self.split_sentences()
+
+
+    def split_sentences(self):
+        """
+        Split the text in sentences with NLTK
+        :return: list of sentences
+        """
+
         return sent_tokenize( self.get_fulltext(), self.language)
 
@@ -0,0 +1,94 @@
+# Class to read the documents of a corpus and extract information from them in a pool of processes.
+# The results are returned in the order of the corpus, the number of chunks that are being processed
+# or waiting to be consumed is limited, so a slow consumer does not fill the memory
+import multiprocessing
+from collections import deque
+
+from texts.corpus import Corpus
+
+
+def extract_texts(document):
+    """
+    The default extraction, the cleaned texts of the document and its sections
+    :param document:
+    :return: tuple (id, text, section texts) with the texts in one line
+    """
+
+    return (document.get_id(), document.get_fulltext_in_one_line(), [section.get_fulltext_in_one_line() for section in document])
+
+
+class TextExtractor:
+
+    CHUNKSIZE = 64      # Number of documents that are sent to a process at once
+    QUEUESIZE = 16      # Maximum number of chunks per process that are being processed or waiting to be consumed
+
+    def __init__(self, corpus, function=extract_texts, workers=1, ids=None, queue_size=QUEUESIZE):
+        """
+        Prepare the extraction
+        :param corpus: the Corpus object
+        :param function: module level function that is called with every document, the result is returned by the iterator
+        :param workers: the number of processes, with 1 process the documents are read in this process
+        :param ids: the ids of the documents, in the order they are returned, None for all documents of the corpus
+        :param queue_size: maximum number of chunks per process that are being processed or waiting to be consumed
+        """
+
+        self.corpus = corpus
+        self.function = function
+        self.workers = workers
+        self.ids = list(ids) if not ids is None else corpus.get_ids()
+        self.queue_size = queue_size
+
+
+    def __len__(self):
+        return len(self.ids)
+
+
+    def __iter__(self):
+        """
+        Iterate through the results of the function for every document
+        :return: generator
+        """
+
+        if self.workers <= 1:
+            for id in self.ids:
+                yield self.function(self.corpus.read_document(id))
+            return
+
+        chunks = (self.ids[start:start + TextExtractor.CHUNKSIZE] for start in range(0, len(self.ids), TextExtractor.CHUNKSIZE))
+        with multiprocessing.Pool(self.workers, initializer=init_worker, initargs=(self.corpus.directory, self.corpus.packed is not None, self.corpus.files, self.corpus.token_cache, self.function)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(extract_worker, (chunk,)))
+                if len(pending) >= self.workers * self.queue_size:
+                    yield from pending.popleft().get()
+
+            while len(pending) > 0:
+                yield from pending.popleft().get()
+
+
+# The functions below are executed in the worker processes
+worker_state = {}
+
+def init_worker(directory, packed, files, token_cache, function):
+    """
+    Open the corpus in this process
+    :param directory: the corpus directory
+    :param packed: whether the corpus is read from the packed corpus, the same choice as the main process
+    :param files: the Xml files of the corpus in the main process, so the directory is not walked again
+    :param token_cache: the file of the TokenCache of the corpus in the main process, or None
+    :param function: the function that is called with every document
+    :return:
+    """
+
+    worker_state["corpus"] = Corpus(directory, cache_size=0, use_packed=packed, files=files, token_cache=token_cache)
+    worker_state["function"] = function
+
+
+def extract_worker(ids):
+    """
+    Read the documents and call the function for every document
+    :param ids: the ids of the documents
+    :return: list with the results
+    """
+
+    return [worker_state["function"](worker_state["corpus"].read_document(id)) for id in ids]
@@ -0,0 +1,100 @@
+# Class for a persistent cache of the sentences and words of documents, stored in a SQLite database.
+# The tokens of a document are stored with the hash of its contents, they are only used if the document
+# has not changed. The database can be used by several processes at the same time
+import os
+import pickle
+import sqlite3
+import zlib
+
+from nltk.tokenize import word_tokenize
+
+
+def tokenize_document(document):
+    """
+    Split the sections of the document in sentences and the sentences in words with NLTK
+    :param document:
+    :return: tuple (sentences, words), sentences has a list of sentences for every section, words has a list of
+             sentences for every section with every sentence a list of words
+    """
+
+    sentences = document.split_sentences()
+    return (sentences, [[word_tokenize( sentence) for sentence in section] for section in sentences])
+
+
+class TokenCache:
+
+    caches = {}     # The opened caches, with the process id and the file as key. A connection is never used by a
+                    # forked child process, SQLite connections must not be carried across a fork
+
+    def __init__(self, file):
+        """
+        Open or create the cache
+        :param file: the SQLite database file
+        """
+
+        self.file = file
+        self.pid = os.getpid()
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(file, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")      # Readers and a writer at the same time
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tokens (id TEXT PRIMARY KEY, hash TEXT NOT NULL, tokens BLOB NOT NULL)")
+        self.connection.commit()
+
+
+    @staticmethod
+    def open(file):
+        """
+        Returns the cache for the file, a cache is opened once per process
+        :param file: the SQLite database file
+        :return: TokenCache object
+        """
+
+        key = (os.getpid(), file)
+        if not key in TokenCache.caches:
+            TokenCache.caches[key] = TokenCache(file)
+
+        return TokenCache.caches[key]
+
+
+    def get_tokens(self, document):
+        """
+        Returns the sentences and words of the document, from the cache if the document has not changed, otherwise
+        the document is tokenized and the tokens are added to the cache
+        :param document:
+        :return: tuple (sentences, words), see tokenize_document
+        """
+
+        content_hash = document.get_content_hash()
+        row = self.connection.execute("SELECT tokens FROM tokens WHERE id = ? AND hash = ?", (document.get_id(), content_hash)).fetchone()
+        if not row is None:
+            self.hits += 1
+            return pickle.loads(zlib.decompress(row[0]))
+
+        self.misses += 1
+        tokens = tokenize_document(document)
+        data = zlib.compress(pickle.dumps(tokens, protocol=pickle.HIGHEST_PROTOCOL))
+        self.connection.execute("INSERT OR REPLACE INTO tokens (id, hash, tokens) VALUES (?, ?, ?)", (document.get_id(), content_hash, data))
+        self.connection.commit()
+
+        return tokens
+
+
+    def get_statistics(self):
+        """
+        Returns the statistics of the cache in this process
+        :return: dictionary with the number of hits and misses
+        """
+
+        return {"hits": self.hits, "misses": self.misses}
+
+
+    def close(self):
+        """
+        Close the database
+        :return:
+        """
+
+        TokenCache.caches.pop((self.pid, self.file), None)
+        self.connection.close()